@@ -21,6 +21,7 @@ import networkx as nx
 import fnss
 
 import heapq 
+import itertools
 
 from icarus.registry import CACHE_POLICY
 from icarus.util import path_links, iround
@@ -187,6 +188,23 @@ class NetworkView(object):
         """
         return self.model.shortest_path[s][t]
 
+    def next_hop(self, s, t):
+        """Return the node following *s* on the shortest path from *s* to *t*
+
+        Parameters
+        ----------
+        s : any hashable type
+            Origin node
+        t : any hashable type
+            Destination node
+
+        Returns
+        -------
+        next_hop : any hashable type
+            The next hop towards *t*, or None if *s* and *t* are the same node
+        """
+        path = self.model.shortest_path[s][t]
+        return path[1] if len(path) > 1 else None
 
     def num_services(self):
         """
@@ -512,8 +530,10 @@ class NetworkModel(object):
         # Dictionary mapping the reverse, i.e. nodes to set of contents stored
         self.source_node = {}
 
-        # A heap with events (see Event class above)
+        # A heap of (time, seq, event) tuples (see Event class above), where 
+        # seq breaks ties between events with the same time in FIFO order
         self.eventQ = []
+        self.event_seq = itertools.count()
 
         # Dictionary of link types (internal/external)
         self.link_type = nx.get_edge_attributes(topology, 'type')
@@ -903,7 +923,24 @@ class NetworkController(object):
         if time == float('inf'):
             raise ValueError("Invalid argument in add_event(): time parameter is infinite")
         e = Event(time, receiver, service, node, flow_id, deadline, rtt_delay, status, task)
-        heapq.heappush(self.model.eventQ, e)
+        heapq.heappush(self.model.eventQ, (time, next(self.model.event_seq), e))
+
+    def add_events(self, events):
+        """Add a batch of arrival events to the eventQ
+
+        Parameters
+        ----------
+        events : iterable of tuples
+            The arguments of add_event() for each event, in the order in which 
+            the events are to be added
+        """
+        eventQ = self.model.eventQ
+        event_seq = self.model.event_seq
+        for args in events:
+            time = args[0]
+            if time == float('inf'):
+                raise ValueError("Invalid argument in add_events(): time parameter is infinite")
+            heapq.heappush(eventQ, (time, next(event_seq), Event(*args)))
 
     def replacement_interval_over(self, flow_id, replacement_interval, timestamp):
         """ Perform replacement of services at each computation spot
@@ -942,6 +979,17 @@ class NetworkController(object):
 
         compSpot.reassign_vm(self, time, serviceToReplace, serviceToAdd, debugFlag)  
         self.collector.reassign_vm(compSpot.node, serviceToReplace, serviceToAdd)
+
+    def reassign_vms(self, time, compSpot, pairs, debugFlag=False):
+        """ Reassign a batch of VMs of a computation spot
+
+        Parameters
+        ----------
+        pairs : iterable of (serviceToReplace, serviceToAdd) tuples
+            One tuple per VM to reassign
+        """
+        for serviceToReplace, serviceToAdd in pairs:
+            self.reassign_vm(time, compSpot, serviceToReplace, serviceToAdd, debugFlag)
     
     def end_session(self, success=True, timestamp=0, flow_id=0):
         """Close a session
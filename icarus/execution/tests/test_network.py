@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import division
+import heapq
 import unittest
 
 import networkx as nx
@@ -94,3 +95,74 @@ class TestNetworkMvc(unittest.TestCase):
         self.controller.rewire_link(1, 8, 1, 5, recompute_paths=True)
         self.assertEqual([0, 1, 2, 3, 4], self.view.shortest_path(0, 4))
         self.assertEqual(1, self.topology.edge[2][3]['a'])
+
+
+class TestNetworkEvents(unittest.TestCase):
+
+    @classmethod
+    def build_topology(cls):
+        # Topology sketch
+        #
+        # 0 ---- 1 ---- 2 ---- 3 ---- 4
+        #        |             |
+        #        |             |
+        #        5 -- 6 - 7 -- 8
+        #
+        topology = IcnTopology()
+        topology.add_path([0, 1, 2, 3, 4])
+        topology.add_path([1, 5, 6, 7, 8, 3])
+        fnss.set_delays_constant(topology, 1, 'ms')
+        topology.graph['receiver_access_delay'] = 0.001
+        topology.graph['depth'] = 4
+        topology.graph['link_delay'] = 0.001
+        fnss.add_stack(topology, 4, 'source', {'contents': [0, 1, 2]})
+        fnss.add_stack(topology, 0, 'receiver', {})
+        for v in (1, 2, 3, 5, 6, 7, 8):
+            fnss.add_stack(topology, v, 'router', {'cache_size': 1})
+        return topology
+
+    def setUp(self):
+        self.topology = self.build_topology()
+        model = network.NetworkModel(self.topology, {'name': 'FIFO'}, 'EDF', 3, 1.0)
+        self.model = model
+        self.view = network.NetworkView(model)
+        self.controller = network.NetworkController(model)
+
+    def test_next_hop(self):
+        # adjacent nodes
+        self.assertEqual(1, self.view.next_hop(0, 1))
+        self.assertEqual(0, self.view.next_hop(1, 0))
+        # multi-hop paths
+        self.assertEqual(1, self.view.next_hop(0, 4))
+        self.assertEqual(3, self.view.next_hop(4, 0))
+        self.assertEqual(6, self.view.next_hop(5, 7))
+        # same node
+        self.assertIsNone(self.view.next_hop(2, 2))
+
+    def test_add_event_equal_time_is_fifo(self):
+        for flow_id in range(5):
+            self.controller.add_event(1.0, 0, 0, 1, flow_id, 2.0, 0, 0)
+        self.controller.add_event(0.5, 0, 0, 1, 10, 2.0, 0, 0)
+        popped = []
+        while self.model.eventQ:
+            time, _, e = heapq.heappop(self.model.eventQ)
+            self.assertEqual(time, e.time)
+            popped.append(e.flow_id)
+        self.assertEqual([10, 0, 1, 2, 3, 4], popped)
+
+    def test_add_events(self):
+        self.controller.add_event(1.0, 0, 0, 1, 0, 2.0, 0, 0)
+        self.controller.add_events([(1.0, 0, 1, 2, 1, 2.0, 0, 1),
+                                    (0.5, 0, 2, 3, 2, 2.0, 0, 2, 'task')])
+        self.controller.add_event(1.0, 0, 0, 1, 3, 2.0, 0, 0)
+        popped = []
+        while self.model.eventQ:
+            popped.append(heapq.heappop(self.model.eventQ)[2])
+        self.assertEqual([2, 0, 1, 3], [e.flow_id for e in popped])
+        self.assertEqual([3, 1, 2, 1], [e.node for e in popped])
+        self.assertEqual(['task', None, None, None], [e.task for e in popped])
+
+    def test_add_events_infinite_time(self):
+        self.assertRaises(ValueError, self.controller.add_events,
+                          [(1.0, 0, 0, 1, 0, 2.0, 0, 0),
+                           (float('inf'), 0, 0, 1, 1, 2.0, 0, 0)])
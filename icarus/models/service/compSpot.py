@@ -8,6 +8,7 @@ import random
 import abc
 import copy
 import heapq 
+from operator import attrgetter
 
 import numpy as np
 
@@ -30,6 +31,31 @@ SUCCESS = 2
 CLOUD = 3
 NO_INSTANCES = 4
 
+# Sort key of the upcoming task queue
+_arrival_time = attrgetter('arrivalTime')
+
+def _queue_index(queue, aTask, key):
+    """
+    Return the position of aTask in queue, which is sorted by the attribute 
+    key, or None if aTask is not in queue. Only the tasks with the same key 
+    as aTask are compared with it.
+    """
+    value = getattr(aTask, key)
+    # Binary search for the first task with the same key
+    lo = 0
+    hi = len(queue)
+    while lo < hi:
+        mid = (lo + hi)//2
+        if getattr(queue[mid], key) < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    while lo < len(queue) and getattr(queue[lo], key) == value:
+        if queue[lo] is aTask:
+            return lo
+        lo += 1
+    return None
+
 class VM(object):
     """
     A VM object to simulate a container, Unikernel, VM, etc.
@@ -161,6 +187,8 @@ class Scheduler(object):
         self._taskQueue = []
         ### Task queue for upcoming tasks that will arrive in the future (i.e., for coordinated strategy) #
         self.upcomingTaskQueue = []
+        ### Tasks in the upcomingTaskQueue indexed by flow_id #
+        self._upcoming_by_flow = {}
         ### Schedule policy #
         self.sched_policy = sched_policy
         ### Request count #
@@ -182,12 +210,31 @@ class Scheduler(object):
         
         return self.idleTime
     
-    def removeFromTaskQueue(self, aTask):
-        self._taskQueue.remove(aTask)
+    def removeFromTaskQueue(self, aTask, indx=None):
+        """
+        Remove aTask from the taskQueue. If given, indx is the position of 
+        aTask in the queue, which saves searching for it.
+        """
+        if indx is None:
+            self._taskQueue.remove(aTask)
+        else:
+            del self._taskQueue[indx]
         if aTask.taskType == Task.TASK_TYPE_SERVICE:
             self.queuedServices[aTask.service] -= 1
             self.queuedServicesPerReceiver[int(aTask.receiver[4:])][aTask.service] -= 1
 
+    def removeFromUpcomingTaskQueue(self, aTask, indx=None):
+        """
+        Remove aTask from the upcomingTaskQueue. If given, indx is the 
+        position of aTask in the queue, which saves searching for it.
+        """
+        if indx is None:
+            self.upcomingTaskQueue.remove(aTask)
+        else:
+            del self.upcomingTaskQueue[indx]
+        if self._upcoming_by_flow.get(aTask.flow_id) is aTask:
+            del self._upcoming_by_flow[aTask.flow_id]
+
     def addVMStartToTaskQ(self, task, curr_time, arrival_time, update_arrival_time = True):
         """ task.nextTask is a VM_START task. Add this task to the taskQ ensuring that 
             existing tasks in the taskQ still meet their deadlines.
@@ -213,9 +260,9 @@ class Scheduler(object):
             else: # next_task in self.upcomingTaskQueue
 
                 if arrival_time > curr_time:
-                    next_task.arrivalTime = arrival_time
+                    self.setArrivalTime(next_task, arrival_time)
                 elif arrival_time == curr_time:
-                    self.upcomingTaskQueue.remove(next_task)
+                    self.removeFromUpcomingTaskQueue(next_task)
                     # Add the next_task to the taskQ
                     if len(self._taskQueue) > 0:
                         if self.sched_policy == 'EDF':
@@ -232,26 +279,88 @@ class Scheduler(object):
                     raise ValueError("Error in addVMStartToTaskQ(): arrival_time for the task: " + str(arrival_time) + " should not be smaller than curr_time: " + str(curr_time))
 
     def addToTaskQueue(self, aTask, time, update_arrival_time = True):
-
-        self._taskQueue.append(aTask)
-
+        """
+        Insert aTask into the taskQueue, which is kept sorted by expiry (EDF) 
+        or arrival time (FIFO), and return the index at which it was inserted.
+        The sort key of a task must not be changed while it is queued (see 
+        setArrivalTime()).
+        """
         if update_arrival_time is True:
             aTask.arrivalTime = time
 
         if self.sched_policy == 'EDF':
-            self._taskQueue = sorted(self._taskQueue, key=lambda x: x.expiry)
+            key = 'expiry'
         elif self.sched_policy == 'FIFO':
-            self._taskQueue = sorted(self._taskQueue, key=lambda x: x.arrivalTime)
+            key = 'arrivalTime'
         else:
             raise ValueError("Invalid scheduling policy")
 
+        # Binary search for the insertion point (after any tasks with the same 
+        # key) rather than re-sorting the whole queue
+        queue = self._taskQueue
+        value = getattr(aTask, key)
+        lo = 0
+        hi = len(queue)
+        while lo < hi:
+            mid = (lo + hi)//2
+            if value < getattr(queue[mid], key):
+                hi = mid
+            else:
+                lo = mid + 1
+        queue.insert(lo, aTask)
+
         if aTask.taskType == Task.TASK_TYPE_SERVICE:
             self.queuedServicesPerReceiver[int(aTask.receiver[4:])][aTask.service] += 1
             self.queuedServices[aTask.service] += 1
+
+        return lo
         
     def addToUpcomingTaskQueue(self, aTask, time):
-        self.upcomingTaskQueue.append(aTask)
-        self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=lambda x: x.arrivalTime)
+        """
+        Insert aTask into the upcomingTaskQueue, which is kept sorted by 
+        arrival time, and return the index at which it was inserted. The 
+        arrival time of a task must not be changed while it is queued (see 
+        setArrivalTime()).
+        """
+        # Binary search for the insertion point (after any tasks with the same 
+        # arrival time) rather than re-sorting the whole queue
+        queue = self.upcomingTaskQueue
+        arrivalTime = aTask.arrivalTime
+        lo = 0
+        hi = len(queue)
+        while lo < hi:
+            mid = (lo + hi)//2
+            if arrivalTime < queue[mid].arrivalTime:
+                hi = mid
+            else:
+                lo = mid + 1
+        queue.insert(lo, aTask)
+        # VM_START tasks have no flow
+        if aTask.flow_id is not None:
+            self._upcoming_by_flow[aTask.flow_id] = aTask
+        return lo
+
+    def setArrivalTime(self, aTask, arrivalTime):
+        """
+        Set the arrival time of aTask. If aTask is queued in the 
+        upcomingTaskQueue (or, with FIFO scheduling, in the taskQueue), it is 
+        removed and inserted again so that the queue stays sorted. Both 
+        queues are sorted by the current arrival time of aTask, so it is 
+        looked up by binary search.
+        """
+        indx = _queue_index(self.upcomingTaskQueue, aTask, 'arrivalTime')
+        if indx is not None:
+            self.removeFromUpcomingTaskQueue(aTask, indx)
+            aTask.arrivalTime = arrivalTime
+            self.addToUpcomingTaskQueue(aTask, arrivalTime)
+            return
+        if self.sched_policy == 'FIFO':
+            indx = _queue_index(self._taskQueue, aTask, 'arrivalTime')
+            if indx is not None:
+                self.removeFromTaskQueue(aTask, indx)
+                self.addToTaskQueue(aTask, arrivalTime)
+                return
+        aTask.arrivalTime = arrivalTime
 
     def get_available_core(self, time, update_arrival_times=True):
         
@@ -319,7 +428,7 @@ class Scheduler(object):
             for task in self.upcomingTaskQueue[:]: 
                 if time < task.arrivalTime:
                     continue
-                aTask = self.upcomingTaskQueue.remove(task)
+                self.removeFromUpcomingTaskQueue(task)
                 self.addToTaskQueue(task, time, update_arrival_times)
                 new_addition = True
         numRunning = 0   
@@ -349,11 +458,11 @@ class Scheduler(object):
         # The following is to accommodate coordinated routing
         if len(self.upcomingTaskQueue) > 0:
             new_addition = False
-            self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=lambda x: x.arrivalTime)
+            self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=_arrival_time)
             for task in self.upcomingTaskQueue[:]: 
                 if time < task.arrivalTime:
                     continue
-                self.upcomingTaskQueue.remove(task)
+                self.removeFromUpcomingTaskQueue(task)
                 self.addToTaskQueue(task, time, False)
                 new_addition = True
 
@@ -434,11 +543,11 @@ class Scheduler(object):
 
         # The following is to accommodate coordinated routing
         if len(self.upcomingTaskQueue) > 0:
-            self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=lambda x: x.arrivalTime)
+            self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=_arrival_time)
             for aTask in self.upcomingTaskQueue[:]: 
                 if time < aTask.arrivalTime:
                     continue
-                self.upcomingTaskQueue.remove(aTask)
+                self.removeFromUpcomingTaskQueue(aTask)
                 self.addToTaskQueue(aTask, time)
 
         aTask = self._taskQueue[0]
@@ -465,11 +574,11 @@ class Scheduler(object):
         
         # The following is to accommodate coordinated routing
         if len(self.upcomingTaskQueue) > 0:
-            self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=lambda x: x.arrivalTime)
+            self.upcomingTaskQueue = sorted(self.upcomingTaskQueue, key=_arrival_time)
             for task in self.upcomingTaskQueue[:]: 
                 if time < task.arrivalTime:
                     continue
-                self.upcomingTaskQueue.remove(task)
+                self.removeFromUpcomingTaskQueue(task)
                 self.addToTaskQueue(task, time)
         
         if (len(self._taskQueue) > 0) and (core_indx is not None):
@@ -483,7 +592,7 @@ class Scheduler(object):
                         aTask.print_task()
                     if len(aTask.nextTask) > 0:
                         for nTask in aTask.nextTask:
-                            nTask.arrivalTime = aTask.completionTime
+                            self.setArrivalTime(nTask, aTask.completionTime)
                     return aTask
                 else:
                     if debug:
@@ -529,6 +638,10 @@ class ComputationSpot(object):
             self.is_cloud = False
         
         self.service_population_size = len(services)
+        # service times, as a list for per-task lookups and as an array for 
+        # the (vectorised) service replacement of the strategies
+        self._service_time = [s.service_time for s in services]
+        self.service_times = np.array(self._service_time, dtype=np.float64)
         self.model = model
 
         if numOfVMs < numOfCores:
@@ -553,11 +666,11 @@ class ComputationSpot(object):
         self.schedulerCopy = None 
 
         # server missed requests (due to congestion)
-        self.missed_requests = [0] * self.service_population_size
+        self.missed_requests = np.zeros(self.service_population_size, dtype=int)
         # service requests that were missed due to insufficient/non-existent VMs
         self.insufficientVMEvents = [0] * self.service_population_size
         # service request count (per service)
-        self.running_requests = [0 for x in range(0, self.service_population_size)]
+        self.running_requests = np.zeros(self.service_population_size, dtype=int)
         # delegated (i.e., upstream) service request counts (per service)
         self.delegated_requests = [0 for x in range(0, self.service_population_size)]
         # The list of all the VMs belonging to the Computation Spot
@@ -711,6 +824,7 @@ class ComputationSpot(object):
         # lists in scheduler to schedulerCopy. 
         self.schedulerCopy._taskQueue = copy.copy(self.scheduler._taskQueue)
         self.schedulerCopy.upcomingTaskQueue = copy.copy(self.scheduler.upcomingTaskQueue)
+        self.schedulerCopy._upcoming_by_flow = copy.copy(self.scheduler._upcoming_by_flow)
         self.schedulerCopy.coreFinishTime = copy.copy(self.scheduler.coreFinishTime)
         self.schedulerCopy.runningServices = copy.copy(self.scheduler.runningServices)
 
@@ -796,7 +910,7 @@ class ComputationSpot(object):
         vm_index : index of the VM that will execute the task
         """
         
-        serviceTime = self.services[service].service_time
+        serviceTime = self._service_time[service]
         if self.is_cloud:
             aTask = Task(time, Task.TASK_TYPE_SERVICE, deadline, rtt_delay, self.node, service, serviceTime, flow_id, receiver)
             controller.add_event(time+serviceTime, receiver, service, self.node, flow_id, deadline, rtt_delay, TASK_COMPLETE, aTask)
@@ -820,9 +934,9 @@ class ComputationSpot(object):
         if numVMs <= 0:
             return [False, NO_INSTANCES]
         aTask = Task(time, Task.TASK_TYPE_SERVICE, deadline, rtt_delay, self.node, service, serviceTime, flow_id, receiver)
-        self.scheduler.addToTaskQueue(aTask, time)
+        indx = self.scheduler.addToTaskQueue(aTask, time)
         self.compute_completion_times(time, True, debug)
-        for task in self.scheduler._taskQueue[:]:
+        for task in self.scheduler._taskQueue:
             if debug:
                 print("After simulate:")
                 task.print_task()
@@ -835,7 +949,7 @@ class ComputationSpot(object):
                 self.missed_requests[service] += 1
                 if debug:
                     print("Refusing TASK: Congestion")
-                self.scheduler.removeFromTaskQueue(aTask)
+                self.scheduler.removeFromTaskQueue(aTask, indx)
                 return [False, CONGESTION]
 
         # New task can be admitted, add to service Queue
@@ -865,7 +979,7 @@ class ComputationSpot(object):
         vm_index : index of the VM that will execute the task
         """
 
-        serviceTime = self.services[service].service_time
+        serviceTime = self._service_time[service]
         if self.is_cloud:
             aTask = Task(time, Task.TASK_TYPE_SERVICE, deadline, rtt_delay, self.node, service, serviceTime, flow_id, receiver)
             controller.add_event(time+serviceTime, receiver, service, self.node, flow_id, deadline, rtt_delay, TASK_COMPLETE, aTask)
@@ -893,9 +1007,9 @@ class ComputationSpot(object):
             return [False, NO_INSTANCES]
 
         aTask = Task(time, Task.TASK_TYPE_SERVICE, deadline, rtt_delay, self.node, service, serviceTime, flow_id, receiver)
-        self.scheduler.addToTaskQueue(aTask, time)
+        indx = self.scheduler.addToTaskQueue(aTask, time)
         self.compute_completion_times(time, True, debug)
-        for task in self.scheduler._taskQueue[:]:
+        for task in self.scheduler._taskQueue:
             if debug:
                 print("After simulate:")
                 task.print_task()
@@ -908,7 +1022,7 @@ class ComputationSpot(object):
                 self.missed_requests[service] += 1
                 if debug:
                     print("Refusing TASK: Congestion")
-                self.scheduler.removeFromTaskQueue(aTask)
+                self.scheduler.removeFromTaskQueue(aTask, indx)
                 return [False, CONGESTION]
         
         # New task can be admitted, add to service Queue
@@ -964,9 +1078,9 @@ class ComputationSpot(object):
                 if debug:
                     print("Admitted with probability: " + str(perAccessPerNodePerServiceProbability[ap][node][aTask.service]))
                 ### Check if the task will satisfy the deadline
-                self.scheduler.addToTaskQueue(aTask, time)
+                indx = self.scheduler.addToTaskQueue(aTask, time)
                 self.compute_completion_times(time, True, debug)
-                for task in self.scheduler._taskQueue[:]:
+                for task in self.scheduler._taskQueue:
                     if debug:
                         print("After simulate:")
                         task.print_task()
@@ -978,14 +1092,14 @@ class ComputationSpot(object):
                     if (task.expiry - task.rtt_delay) < task.completionTime:
                         if debug:
                             print("Refusing TASK: Congestion")
-                        self.scheduler.removeFromTaskQueue(aTask)
+                        self.scheduler.removeFromTaskQueue(aTask, indx)
                         return False
                 return True
         elif (availableInstances - numQueuedAndRunning) > 1:
             ### Check if the task will satisfy the deadline
-            self.scheduler.addToTaskQueue(aTask, time)
+            indx = self.scheduler.addToTaskQueue(aTask, time)
             self.compute_completion_times(time, True, debug)
-            for task in self.scheduler._taskQueue[:]:
+            for task in self.scheduler._taskQueue:
                 if debug:
                     print("After simulate:")
                     task.print_task()
@@ -997,7 +1111,7 @@ class ComputationSpot(object):
                 if (task.expiry - task.rtt_delay) < task.completionTime:
                     if debug:
                         print("Refusing TASK: Congestion")
-                    self.scheduler.removeFromTaskQueue(aTask)
+                    self.scheduler.removeFromTaskQueue(aTask, indx)
                     return False
             if debug:
                 print("Admitted")
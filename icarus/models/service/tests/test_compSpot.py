@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+import unittest
+
+from icarus.models.service.compSpot import Scheduler, Task, _queue_index
+
+
+class MockTopology(object):
+
+    def receivers(self):
+        return ['rec_0', 'rec_1']
+
+
+class MockModel(object):
+
+    topology = MockTopology()
+
+
+class MockComputationSpot(object):
+
+    def __init__(self, n_services=2, numOfCores=1):
+        self.numOfCores = numOfCores
+        self.service_population_size = n_services
+        self.services = [None]*n_services
+        self.model = MockModel()
+
+
+class TestScheduler(unittest.TestCase):
+
+    def task(self, flow_id, arrivalTime):
+        return Task(0.0, Task.TASK_TYPE_SERVICE, 10.0, 0.0, 1, 0, 1.0,
+                    flow_id, 'rec_0', arrivalTime)
+
+    def setUp(self):
+        self.scheduler = Scheduler('EDF', MockComputationSpot())
+
+    def test_add_to_upcoming_task_queue_sorted(self):
+        for flow_id, arrival in enumerate([3.0, 1.0, 2.0, 0.5, 4.0]):
+            self.scheduler.addToUpcomingTaskQueue(self.task(flow_id, arrival), 0.0)
+        self.assertEqual([0.5, 1.0, 2.0, 3.0, 4.0],
+                         [t.arrivalTime for t in self.scheduler.upcomingTaskQueue])
+
+    def test_add_to_upcoming_task_queue_index(self):
+        queue = self.scheduler.upcomingTaskQueue
+        self.assertEqual(0, self.scheduler.addToUpcomingTaskQueue(self.task(0, 2.0), 0.0))
+        self.assertEqual(0, self.scheduler.addToUpcomingTaskQueue(self.task(1, 1.0), 0.0))
+        indx = self.scheduler.addToUpcomingTaskQueue(self.task(2, 1.5), 0.0)
+        self.assertEqual(1, indx)
+        self.assertEqual(2, queue[indx].flow_id)
+
+    def test_add_to_upcoming_task_queue_stable(self):
+        # Tasks with equal arrival times keep their insertion order
+        for flow_id in range(3):
+            self.scheduler.addToUpcomingTaskQueue(self.task(flow_id, 1.0), 0.0)
+        self.assertEqual([0, 1, 2],
+                         [t.flow_id for t in self.scheduler.upcomingTaskQueue])
+
+    def test_upcoming_task_queue_flow_index(self):
+        tasks = [self.task(flow_id, 1.0 + flow_id) for flow_id in range(3)]
+        for aTask in tasks:
+            self.scheduler.addToUpcomingTaskQueue(aTask, 0.0)
+        self.assertIs(tasks[1], self.scheduler._upcoming_by_flow[1])
+        self.scheduler.removeFromUpcomingTaskQueue(tasks[1])
+        self.scheduler.removeFromUpcomingTaskQueue(tasks[2], 1)
+        self.assertEqual([0], [t.flow_id for t in self.scheduler.upcomingTaskQueue])
+        self.assertEqual([0], list(self.scheduler._upcoming_by_flow))
+
+    def test_add_to_task_queue_edf(self):
+        tasks = [Task(0.0, Task.TASK_TYPE_SERVICE, expiry, 0.0, 1, 0, 1.0, flow_id, 'rec_0')
+                 for flow_id, expiry in enumerate([3.0, 1.0, 2.0, 1.0])]
+        indices = [self.scheduler.addToTaskQueue(aTask, 0.0) for aTask in tasks]
+        self.assertEqual([0, 0, 1, 1], indices)
+        self.assertEqual([1, 3, 2, 0], [t.flow_id for t in self.scheduler._taskQueue])
+        self.assertEqual(4, self.scheduler.queuedServices[0])
+        self.scheduler.removeFromTaskQueue(tasks[3], 1)
+        self.assertEqual([1, 2, 0], [t.flow_id for t in self.scheduler._taskQueue])
+        self.assertEqual(3, self.scheduler.queuedServices[0])
+
+    def test_vm_start_not_in_flow_index(self):
+        vm_start = Task(0.0, Task.TASK_TYPE_VM_START, float('inf'), 0, 1, 0, 0.8,
+                        None, None, float('inf'))
+        self.scheduler.addToUpcomingTaskQueue(self.task(0, 1.0), 0.0)
+        self.scheduler.addToUpcomingTaskQueue(vm_start, 0.0)
+        self.assertEqual([0], list(self.scheduler._upcoming_by_flow))
+        self.scheduler.removeFromUpcomingTaskQueue(vm_start)
+        self.assertEqual([0], list(self.scheduler._upcoming_by_flow))
+
+    def test_set_arrival_time_reinserts_upcoming_task(self):
+        vm_start = Task(0.0, Task.TASK_TYPE_VM_START, float('inf'), 0, 1, 0, 0.8,
+                        None, None, float('inf'))
+        for flow_id, arrival in enumerate([1.0, 2.0, 3.0]):
+            self.scheduler.addToUpcomingTaskQueue(self.task(flow_id, arrival), 0.0)
+        self.scheduler.addToUpcomingTaskQueue(vm_start, 0.0)
+        self.assertIs(vm_start, self.scheduler.upcomingTaskQueue[-1])
+        self.scheduler.setArrivalTime(vm_start, 1.5)
+        self.assertEqual(1.5, vm_start.arrivalTime)
+        self.assertIs(vm_start, self.scheduler.upcomingTaskQueue[1])
+        self.assertEqual([1.0, 1.5, 2.0, 3.0],
+                         [t.arrivalTime for t in self.scheduler.upcomingTaskQueue])
+
+    def test_set_arrival_time_of_unqueued_task(self):
+        aTask = self.task(0, 1.0)
+        self.scheduler.setArrivalTime(aTask, 2.0)
+        self.assertEqual(2.0, aTask.arrivalTime)
+        self.assertEqual([], self.scheduler.upcomingTaskQueue)
+
+    def test_queue_index(self):
+        tasks = [self.task(flow_id, arrival)
+                 for flow_id, arrival in enumerate([1.0, 2.0, 2.0, 2.0, 3.0])]
+        for indx, aTask in enumerate(tasks):
+            self.assertEqual(indx, _queue_index(tasks, aTask, 'arrivalTime'))
+        # Not queued, with and without a task of the same key
+        self.assertIsNone(_queue_index(tasks, self.task(5, 2.0), 'arrivalTime'))
+        self.assertIsNone(_queue_index(tasks, self.task(5, 2.5), 'arrivalTime'))
+        self.assertIsNone(_queue_index([], tasks[0], 'arrivalTime'))
+
+    def test_set_arrival_time_among_equal_arrival_times(self):
+        tasks = [self.task(flow_id, 1.0) for flow_id in range(3)]
+        for aTask in tasks:
+            self.scheduler.addToUpcomingTaskQueue(aTask, 0.0)
+        self.scheduler.setArrivalTime(tasks[1], 0.5)
+        self.assertEqual([1, 0, 2], [t.flow_id for t in self.scheduler.upcomingTaskQueue])
+        self.assertIs(tasks[1], self.scheduler._upcoming_by_flow[1])
+
+    def test_add_to_task_queue_edf_out_of_order_and_ties(self):
+        expiries = [5.0, 2.0, 5.0, 1.0, 2.0, 6.0]
+        tasks = [Task(0.0, Task.TASK_TYPE_SERVICE, expiry, 0.0, 1, 0, 1.0, flow_id, 'rec_0')
+                 for flow_id, expiry in enumerate(expiries)]
+        indices = [self.scheduler.addToTaskQueue(aTask, 0.0) for aTask in tasks]
+        queue = self.scheduler._taskQueue
+        # Ties are queued after the tasks with the same expiry
+        self.assertEqual([3, 1, 4, 0, 2, 5], [t.flow_id for t in queue])
+        self.assertEqual([0, 0, 2, 0, 2, 5], indices)
+
+    def test_add_to_task_queue_fifo(self):
+        scheduler = Scheduler('FIFO', MockComputationSpot())
+        arrivals = [3.0, 1.0, 3.0, 2.0, 1.0]
+        indices = []
+        for flow_id, arrival in enumerate(arrivals):
+            aTask = self.task(flow_id, None)
+            indx = scheduler.addToTaskQueue(aTask, arrival)
+            self.assertIs(aTask, scheduler._taskQueue[indx])
+            indices.append(indx)
+        self.assertEqual([0, 0, 2, 1, 1], indices)
+        self.assertEqual([1, 4, 3, 0, 2], [t.flow_id for t in scheduler._taskQueue])
+        self.assertEqual([1.0, 1.0, 2.0, 3.0, 3.0],
+                         [t.arrivalTime for t in scheduler._taskQueue])
+
+    def test_add_to_task_queue_fifo_keep_arrival_time(self):
+        scheduler = Scheduler('FIFO', MockComputationSpot())
+        for flow_id, arrival in enumerate([2.0, 1.0, 2.0]):
+            scheduler.addToTaskQueue(self.task(flow_id, arrival), 5.0, False)
+        self.assertEqual([1, 0, 2], [t.flow_id for t in scheduler._taskQueue])
+        self.assertEqual([1.0, 2.0, 2.0],
+                         [t.arrivalTime for t in scheduler._taskQueue])
+
+    def test_set_arrival_time_reinserts_fifo_task(self):
+        scheduler = Scheduler('FIFO', MockComputationSpot())
+        tasks = [self.task(flow_id, None) for flow_id in range(3)]
+        for aTask, arrival in zip(tasks, [1.0, 2.0, 3.0]):
+            scheduler.addToTaskQueue(aTask, arrival)
+        scheduler.setArrivalTime(tasks[0], 2.5)
+        self.assertEqual([1, 0, 2], [t.flow_id for t in scheduler._taskQueue])
+        self.assertEqual(3, scheduler.queuedServices[0])
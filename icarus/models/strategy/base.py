@@ -17,6 +17,9 @@ class Strategy(object):
 
     __metaclass__ = abc.ABCMeta
 
+    # Subclasses not declaring __slots__ still get an instance __dict__
+    __slots__ = ('view', 'controller')
+
     def __init__(self, view, controller, **kwargs):
         """Constructor
 
@@ -3,10 +3,16 @@
 from __future__ import division
 from __future__ import print_function
 
+import abc
+import heapq
+import logging
 import networkx as nx
+import numpy as np
 import random
 import sys
 
+from collections import defaultdict
+from itertools import chain
 from math import ceil
 from icarus.registry import register_strategy
 from icarus.util import inheritdoc, path_links
@@ -20,6 +26,8 @@ __all__ = [
        'Coordinated'
            ]
 
+logger = logging.getLogger(__name__)
+
 # Status codes
 REQUEST = 0
 RESPONSE = 1
@@ -31,6 +39,101 @@ SUCCESS = 2
 CLOUD = 3
 NO_INSTANCES = 4
 
+_INF = float('inf')
+_TASK_TYPE_VM_START = Task.TASK_TYPE_VM_START
+
+def _misses_deadline(tasks, delay):
+    """
+    Return True if any service task in tasks completes after its expiry 
+    (less delay) or cannot be completed at all. 
+    """
+    for task in tasks:
+        if task.taskType == _TASK_TYPE_VM_START:
+            continue
+        completionTime = task.completionTime
+        if (task.expiry - delay) < completionTime or completionTime == _INF:
+            return True
+    return False
+
+def _path_delays(view):
+    """
+    Return the path delay from every node to every other node, keyed by 
+    (source, destination). Paths are static for the whole simulation, so 
+    the table is built once rather than per event.
+    """
+    nodes = view.topology().nodes()
+    return {(u, v) : view.path_delay(u, v) for u in nodes for v in nodes}
+
+def _path_tables(view):
+    """
+    Return the next hop and the path delay (see _path_delays()) from every 
+    node to every other node, keyed by (source, destination).
+    """
+    nodes = view.topology().nodes()
+    next_hop = {(u, v) : view.next_hop(u, v) for u in nodes for v in nodes}
+    return next_hop, _path_delays(view)
+
+def _distribute_vms(deployed_vms, utils, remaining_vms, interval):
+    """
+    Distribute remaining_vms spare VMs of a computation spot among services 
+    ranked by decreasing utilisation, and return the resulting number of VMs 
+    of each service.
+
+    This is the closed form of repeated rounds over the services in order: a 
+    service that has VMs gets one more, and a service with none gets 
+    ceil(util/interval) VMs, until there are no VMs left to distribute. Only 
+    the first round can deploy new services, so later rounds split the rest 
+    evenly among the deployed ones (the first of them get one more).
+    """
+    vms = deployed_vms.copy()
+    # First round
+    demand = np.where(vms > 0, 1, np.ceil(utils/interval)).astype(int)
+    vms += np.minimum(demand, np.maximum(remaining_vms - (np.cumsum(demand) - demand), 0))
+    remaining_vms -= (vms - deployed_vms).sum()
+    # Further rounds
+    deployed = np.flatnonzero(vms)
+    if remaining_vms > 0 and len(deployed) > 0:
+        vms[deployed] += remaining_vms // len(deployed)
+        vms[deployed[:remaining_vms % len(deployed)]] += 1
+    return vms
+
+def _allocate_vms(utils, num_vms, interval):
+    """
+    Allocate the num_vms VMs of a computation spot to services ranked by 
+    decreasing utilisation utils, and return the number of VMs of each 
+    service.
+
+    Each service in turn gets round(util/interval) VMs while there are VMs 
+    left, and the rest are spread by _distribute_vms().
+    """
+    vms = np.zeros(len(utils), dtype=int)
+    remaining_vms = num_vms
+    for indx, util in enumerate(utils):
+        if remaining_vms == 0:
+            break
+        vms[indx] = min(int(round(util/interval)), remaining_vms)
+        remaining_vms -= vms[indx]
+    if remaining_vms > 0 and len(utils) > 0:
+        vms = _distribute_vms(vms, np.asarray(utils), remaining_vms, interval)
+    return vms
+
+def _plan_replacements(vm_services, vm_vals, cand_services, cand_vals, k):
+    """
+    Pair the ranked VMs with the ranked candidate services of a computation 
+    spot and return the services to replace and the services replacing them, 
+    as two arrays of at most k elements.
+
+    Small metric is better: the i-th VM is replaced by the i-th candidate, up 
+    to the first pair where the VM's metric is larger than the candidate's.
+    """
+    n = min(len(vm_services), len(cand_services))
+    worse = vm_vals[:n] > cand_vals[:n]
+    if worse.any():
+        n = int(np.argmax(worse))
+    # Are they the same service? This should not happen really
+    swaps = np.flatnonzero(vm_services[:n] != cand_services[:n])[:k]
+    return vm_services[swaps], cand_services[swaps]
+
 @register_strategy('COORDINATED')
 class Coordinated(Strategy):
     """
@@ -40,6 +143,7 @@ class Coordinated(Strategy):
     """
     def __init__(self, view, controller, replacement_interval=10, debug=False, p = 0.5, **kwargs):
         super(Coordinated, self).__init__(view,controller)
+        self._add_event = controller.add_event
         self.last_replacement = 0
         self.replacement_interval = replacement_interval
         self.receivers = view.topology().receivers()
@@ -47,14 +151,45 @@ class Coordinated(Strategy):
         self.compSpots = self.view.service_nodes()
         self.num_nodes = len(self.compSpots.keys())
         self.num_services = self.view.num_services()
-        self.serviceNodeUtil = [None]*len(self.receivers)
-        self.numVMsPerService = [[0] * self.num_services for x in range(self.num_nodes)]
+        # Utilisation of each service at each node, per receiver (access point)
+        self.serviceNodeUtil = np.zeros((len(self.receivers), self.num_nodes, self.num_services))
+        # Number of VMs to deploy for each service at each node
+        self.numVMsPerService = np.zeros((self.num_nodes, self.num_services), dtype=int)
         self.debug = debug
         self.p = p
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
+        # Edge (non-cloud) computation spots, and the same nodes grouped by depth
+        self._edge_nodes = [n for n, cs in self.compSpots.items() if not cs.is_cloud]
+        self._edge_cs = [(n, self.compSpots[n]) for n in self._edge_nodes]
+        self._nodes_by_height = defaultdict(list)
+        for n in self._edge_nodes:
+            self._nodes_by_height[self.topo.node[n]['depth']].append(n)
+        # Path delays are static for the whole simulation (no next hops, as 
+        # requests are sent straight to the selected node)
+        self._path_delay = _path_delays(view)
+        # Content sources and services are fixed as well
+        self._services = self.view.services()
+        self._content_source = [self.view.content_source(s) for s in range(self.num_services)]
+        self._service_time = [self._services[s].service_time for s in range(self.num_services)]
+        self._deadlines = np.array([self._services[s].deadline for s in range(self.num_services)])
+        self._service_times = np.array(self._service_time)
+        # Receiver ids (serviceNodeUtil rows), parsed once from the names
+        self._recv_ids = {recv : int(recv[4:]) for recv in self.receivers}
+        # ... and in receiver iteration order
+        self._receiver_id_list = [self._recv_ids[recv] for recv in self.receivers]
+        # Delay from each receiver to each (edge) node
+        recv_node_delay = np.full((len(self.receivers), self.num_nodes), np.inf)
+        for recv in self.receivers:
+            for node in self._edge_nodes:
+                recv_node_delay[self._recv_ids[recv], node] = self._path_delay[(recv, node)]
+        # Edge nodes on the path from each receiver to each content source
+        self._path_edge_nodes = {}
+        for recv in self.receivers:
+            for source in set(self._content_source):
+                path = self.view.shortest_path(recv, source)
+                self._path_edge_nodes[(recv, source)] = np.array([n for n in path[1:] if n in self._edge_nodes], dtype=int)
+        # (receiver, node, service) combinations whose deadline can be met
+        self._feasible_mask = self._deadlines > (2*recv_node_delay[:, :, np.newaxis] + self._service_times)
+        for node, cs in self._edge_cs:
             #cs.numOfVMs = cs.service_population_size*cs.numOfCores
             #cs.scheduler.numOfVMs = cs.numOfVMs
             ### Place numOfCores instances for each service type 
@@ -67,35 +202,18 @@ class Coordinated(Strategy):
             for vm in range(cs.numOfVMs):
                 serv = vm % cs.service_population_size 
                 cs.numberOfVMInstances[serv] += 1 
-                self.numVMsPerService[cs.node][serv] = cs.numberOfVMInstances[serv]
+                self.numVMsPerService[cs.node, serv] = cs.numberOfVMInstances[serv]
                 aVM = VM(cs, serv)
                 cs.scheduler.idleVMs[serv].append(aVM)
 
-        for recv in self.receivers:
-            recv = int(recv[4:])
-            self.serviceNodeUtil[recv] = [None]*self.num_nodes
-            for n in self.compSpots.keys():
-                cs = self.compSpots[n]
-                if cs.is_cloud:
-                    continue
-                self.serviceNodeUtil[recv][n] = [0.0]*self.num_services
-            
     def initialise_metrics(self):
         """
         Initialise metrics/counters to 0
         """
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
+        for cs in self.compSpots.values():
             cs.scheduler.idleTime = 0.0
 
-        for recv in self.receivers:
-            recv = int(recv[4:])
-            self.serviceNodeUtil[recv] = [None]*self.num_nodes
-            for n in self.compSpots.keys():
-                cs = self.compSpots[n]
-                if cs.is_cloud:
-                    continue
-                self.serviceNodeUtil[recv][n] = [0.0]*self.num_services
+        self.serviceNodeUtil.fill(0.0)
 
     def find_topmost_feasible_node(self, receiver, flow_id, path, time, service, deadline, rtt_delay):
         """
@@ -105,10 +223,11 @@ class Coordinated(Strategy):
         tasks that require closer comp. spots.
         """
 
-        source = self.view.content_source(service)
+        source = self._content_source[service]
         # start from the upper-most node in the path and check feasibility
         upstream_node = source
         aTask = None
+        serviceTime = self._service_time[service]
         for n in reversed(path[1:-1]):
             cs = self.compSpots[n]
             if cs.is_cloud:
@@ -117,26 +236,21 @@ class Coordinated(Strategy):
                 continue
             if len(cs.scheduler.busyVMs[service]) + len(cs.scheduler.idleVMs[service]) <= 0:
                 continue
-            delay = self.view.path_delay(receiver, n)
+            delay = self._path_delay[(receiver, n)]
             rtt_to_cs = rtt_delay + 2*delay
-            serviceTime = cs.services[service].service_time
             if deadline - time - rtt_to_cs < serviceTime:
                 continue
             aTask = Task(time, Task.TASK_TYPE_SERVICE, deadline, rtt_to_cs, n, service, serviceTime, flow_id, receiver, time+delay)
-            cs.scheduler.upcomingTaskQueue.append(aTask)
-            cs.scheduler.upcomingTaskQueue = sorted(cs.scheduler.upcomingTaskQueue, key=lambda x: x.arrivalTime)
+            indx = cs.scheduler.addToUpcomingTaskQueue(aTask, time)
             cs.compute_completion_times(time, False, self.debug)
-            for task in cs.scheduler._taskQueue + cs.scheduler.upcomingTaskQueue:
-                if self.debug:
-                    print("After compute_completion_times:")
+            if self.debug:
+                print("After compute_completion_times:")
+                for task in chain(cs.scheduler._taskQueue, cs.scheduler.upcomingTaskQueue):
                     task.print_task()
-                if task.taskType == Task.TASK_TYPE_VM_START:
-                    continue
-                if ( (task.expiry - delay) < task.completionTime ) or ( task.completionTime == float('inf') ):
-                    cs.scheduler.upcomingTaskQueue.remove(aTask)
-                    if self.debug:
-                        print ("Task with flow_id " + str(aTask.flow_id) + " is violating its expiration time at node: " + str(n))
-                    break
+            if _misses_deadline(chain(cs.scheduler._taskQueue, cs.scheduler.upcomingTaskQueue), delay):
+                cs.scheduler.removeFromUpcomingTaskQueue(aTask, indx)
+                if self.debug:
+                    print ("Task with flow_id " + str(aTask.flow_id) + " is violating its expiration time at node: " + str(n))
             else:
                 source = n
                 #if self.debug:
@@ -156,32 +270,26 @@ class Coordinated(Strategy):
         the global demand as they are deployed. 
         """
         for height in range(self.topo.graph['height']+1):
-            nodes = []
             ### Get nodes with depth = height #
-            for node in self.compSpots.keys():
-                cs = self.compSpots[node]
-                if cs.is_cloud:
-                    continue
-                if self.topo.node[node]['depth'] == height:
-                    nodes.append(node)
-                    ### initialise number of service instances to zero #
-                    for service in range(self.num_services):
-                        self.numVMsPerService[node][service] = 0
-                        #cs.numberOfVMInstances[service] = 0
+            nodes = self._nodes_by_height[height]
+            ### initialise number of service instances to zero #
+            self.numVMsPerService[nodes] = 0
                 
             for node in nodes:
                 cs = self.compSpots[node]
-                service_utils = {x:0.0 for x in range(self.num_services)}
                 ### sort services that are executable at the node by their utilisation #
-                for recv in self.receivers:
-                    ap = int(recv[4:])
-                    for service in range(self.num_services):
-                        if self.serviceNodeUtil[ap][node][service] == 0:
-                            continue
-                        service_obj = self.view.services()[service]
-                        if service_obj.deadline > (2*self.view.path_delay(recv, node) + service_obj.service_time):
-                            service_utils[service] += self.serviceNodeUtil[ap][node][service]
-                service_utils_sorted = sorted(service_utils.items(), key = lambda x: x[1], reverse=True)
+                recv_ids = self._receiver_id_list
+                service_utils = (self.serviceNodeUtil[recv_ids, node, :] * self._feasible_mask[recv_ids, node, :]).sum(axis=0).tolist()
+                # Largest utilisation first (ties in service order). Only the 
+                # top numOfVMs services can receive VMs: round(util/interval) 
+                # does not increase down the ranking, so the first pass of 
+                # _allocate_vms gives VMs to a prefix of it, and the second 
+                # (_distribute_vms) gives every further service with a 
+                # non-zero utilisation at least one VM, in order. Each 
+                # service that receives VMs takes at least one, so they run 
+                # out by the numOfVMs-th service.
+                order = heapq.nlargest(cs.numOfVMs, range(self.num_services), key=service_utils.__getitem__)
+                service_utils_sorted = [(service, service_utils[service]) for service in order]
                 
                 if self.debug:
                     count = 0
@@ -191,88 +299,36 @@ class Coordinated(Strategy):
                         if count == 10:
                             break
                 
-                remaining_vms = cs.numOfVMs
-                for service, util in service_utils_sorted:
-                    num_vms = int(round(util/(self.replacement_interval)))
-                    if remaining_vms > 0 and num_vms > 0:
-                        for recv in self.receivers:
-                            ap = int(recv[4:])
-                            if self.serviceNodeUtil[ap][node][service] == 0:
-                                continue
-                            else:
-                                path = self.view.shortest_path(recv, node)
-                                for n in path[1:]:
-                                   self.serviceNodeUtil[ap][n][service] = 0.0
-                    #cs.numberOfVMInstances[service] = min(num_vms, remaining_vms)
-                    self.numVMsPerService[cs.node][service] = min(num_vms, remaining_vms)
-                    #if self.debug and cs.numberOfVMInstances[service] > 0:
-                    if self.debug and self.numVMsPerService[cs.node][service] > 0:
-                        #print(str(cs.numberOfVMInstances[service]) + " vms are instantiated at node: " + str(node) + " for service: " + str(service))
-                        print(str(self.numVMsPerService[cs.node][service]) + " vms are instantiated at node: " + str(cs.node) + " for service: " + str(service))
-                    #remaining_vms -= cs.numberOfVMInstances[service]
-                    remaining_vms -= self.numVMsPerService[cs.node][service]
-
-                    if remaining_vms == 0:
-                        break
-                while remaining_vms > 0:
-                    newAddition = False
-                    for service, util in service_utils_sorted:
-                        #if(cs.numberOfVMInstances[service] > 0):
-                        if(self.numVMsPerService[cs.node][service] > 0):
-                            newAddition = True
-                            #cs.numberOfVMInstances[service] += 1
-                            self.numVMsPerService[cs.node][service] += 1
-                            remaining_vms -= 1
-                            if self.debug:
-                                print ("One additional vm is instantiated at node: " + str(node) + " for service: " + str(service))
+                services = np.array(order, dtype=int)
+                vms = _allocate_vms([util for service, util in service_utils_sorted], cs.numOfVMs, self.replacement_interval)
+                # Requests for the deployed services are served here, so 
+                # remove their demand from this node and the nodes below it
+                for service in services[vms > 0]:
+                    for recv in self.receivers:
+                        ap = self._recv_ids[recv]
+                        if self.serviceNodeUtil[ap, node, service] == 0:
+                            continue
                         else:
-                            num_vms = int(ceil(util/(self.replacement_interval)))
-                            num_vms = min(num_vms, remaining_vms)
-                            if num_vms > 0:
-                                #cs.numberOfVMInstances[service] = num_vms
-                                self.numVMsPerService[cs.node][service] = num_vms
-                                newAddition = True
-                                remaining_vms -= num_vms
-                                for recv in self.receivers:
-                                    ap = int(recv[4:])
-                                    if self.serviceNodeUtil[ap][node][service] == 0:
-                                        continue
-                                    else:
-                                        path = self.view.shortest_path(recv, node)
-                                        for n in path[1:]:
-                                           self.serviceNodeUtil[ap][n][service] = 0.0
-                                if self.debug:
-                                    print (str(num_vms) + " additional vm is instantiated at node: " + str(node) + " for service: " + str(service))
-                        if remaining_vms == 0:
-                            break
-                    if newAddition is False:
-                        break
+                            path = self.view.shortest_path(recv, node)
+                            for n in path[1:]:
+                               self.serviceNodeUtil[ap, n, service] = 0.0
+                self.numVMsPerService[cs.node, services] = vms
+                if self.debug:
+                    for service, num_vms in zip(services, vms):
+                        if num_vms > 0:
+                            print(str(num_vms) + " vms are instantiated at node: " + str(cs.node) + " for service: " + str(service))
         # Report the VM instantiations (diff with the previous timeslot)
-        for node in self.compSpots.keys():
-            servicesToReplace = []
-            servicesToAdd = []
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            for service in range(self.num_services):
-                #diff = cs.numberOfVMInstances[service] - self.numVMsPerService[cs.node][service]
-                diff = self.numVMsPerService[cs.node][service] - cs.numberOfVMInstances[service]
-                #self.numVMsPerService[cs.node][service] = cs.numberOfVMInstances[service]
-                if diff > 0:
-                    while diff != 0:
-                        servicesToAdd.append(service)
-                        diff -= 1
-                elif diff < 0:
-                    while diff != 0:
-                        servicesToReplace.append(service)
-                        diff += 1
+        for node, cs in self._edge_cs:
+            diff = self.numVMsPerService[cs.node] - np.asarray(cs.numberOfVMInstances)
+            # Each service is listed once per VM to be added (or replaced)
+            services = np.arange(self.num_services)
+            servicesToAdd = np.repeat(services, np.maximum(diff, 0)).tolist()
+            servicesToReplace = np.repeat(services, np.maximum(-diff, 0)).tolist()
             if len(servicesToReplace) != len(servicesToAdd):
                 print("Error: Services to replace " + str(servicesToReplace) + " is different in size from: " + str(servicesToAdd))
                 raise ValueError("This should not happen in Coordinated strategy replace_services()")
-            for indx in range(len(servicesToAdd)):
-                serviceToAdd = servicesToAdd[indx]
-                serviceToReplace = servicesToReplace[indx] 
-                self.controller.reassign_vm(time, cs, serviceToReplace, serviceToAdd, self.debug)
+            if servicesToAdd:
+                self.controller.reassign_vms(time, cs, zip(servicesToReplace, servicesToAdd), self.debug)
 
     # Coordinated            
     @inheritdoc(Strategy)
@@ -286,7 +342,7 @@ class Coordinated(Strategy):
         service = content
         if self.debug:
             print ("\nEvent\n time: " + repr(time) + " receiver  " + repr(receiver) + " service " + repr(service) + " node " + repr(node) + " flow_id " + repr(flow_id) + " deadline " + repr(deadline) + " status " + repr(status)) 
-        source = self.view.content_source(service)
+        source = self._content_source[service]
         if time - self.last_replacement > self.replacement_interval:
             #self.print_stats()
             self.controller.replacement_interval_over(flow_id, self.replacement_interval, time)
@@ -294,35 +350,30 @@ class Coordinated(Strategy):
             self.last_replacement = time
             self.initialise_metrics()
         # Process request based on status
-        if receiver == node and status == REQUEST:
+        is_request = (status == REQUEST)
+        if receiver == node and is_request:
             self.controller.start_session(time, receiver, service, log, flow_id, deadline)
             path = self.view.shortest_path(node, source)
             upstream_node = self.find_topmost_feasible_node(receiver, flow_id, path, time, service, deadline, rtt_delay)
-            delay = self.view.path_delay(node, upstream_node)
+            delay = self._path_delay[(node, upstream_node)]
             rtt_delay += delay*2
             if upstream_node != source:
-                self.controller.add_event(time+delay, receiver, service, upstream_node, flow_id, deadline, rtt_delay, REQUEST)
+                self._add_event(time+delay, receiver, service, upstream_node, flow_id, deadline, rtt_delay, REQUEST)
                 if self.debug:
                     print ("Request is scheduled to run at: " + str(upstream_node))
             else: #request is to be executed in the cloud and returned to receiver
-                services = self.view.services() 
-                serviceTime = services[service].service_time
-                self.controller.add_event(time+rtt_delay+serviceTime, receiver, service, receiver, flow_id, deadline, rtt_delay, RESPONSE)
+                serviceTime = self._service_time[service]
+                self._add_event(time+rtt_delay+serviceTime, receiver, service, receiver, flow_id, deadline, rtt_delay, RESPONSE)
                 if self.debug:
                     print ("Request is scheduled to run at the CLOUD")
-            for n in path[1:]:
-                cs = self.view.compSpot(n)
-                if cs.is_cloud:
-                    continue
-                self.serviceNodeUtil[int(receiver[4:])][n][service] += self.view.services()[service].service_time
+            edge_nodes = self._path_edge_nodes[(receiver, source)]
+            self.serviceNodeUtil[self._recv_ids[receiver], edge_nodes, service] += self._service_time[service]
             return
-        elif status == REQUEST and node != source:
-            compSpot = self.view.compSpot(node)
+        elif is_request and node != source:
+            compSpot = self.compSpots[node]
             #check if the request is in the upcomingTaskQueue
-            for thisTask in compSpot.scheduler.upcomingTaskQueue:
-                if thisTask.flow_id == flow_id:
-                    break
-            else: # task for the flow_id is not in the Queue
+            if flow_id not in compSpot.scheduler._upcoming_by_flow:
+                # task for the flow_id is not in the Queue
                 print ("Flow id: " + str(flow_id) + " is missing in the upcoming task queue")
                 for thisTask in compSpot.scheduler._taskQueue:
                     if thisTask.flow_id == flow_id:
@@ -331,7 +382,7 @@ class Coordinated(Strategy):
                     raise ValueError("No task with the given flow id: " + str(flow_id) + " in the upcomingTaskQueue or TaskQueue of node: " + str(node))
             newTask = compSpot.scheduler.schedule(time)
             if newTask is not None:
-                self.controller.add_event(newTask.completionTime, newTask.receiver, newTask.service, compSpot.node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask) 
+                self._add_event(newTask.completionTime, newTask.receiver, newTask.service, compSpot.node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask) 
                 if self.debug:
                     print ("Task is scheduled to run: ")
                     newTask.print_task()
@@ -347,16 +398,16 @@ class Coordinated(Strategy):
                         aTask.print_task()
 
         elif status == TASK_COMPLETE:
-            compSpot = self.view.compSpot(node)
+            compSpot = self.compSpots[node]
             self.controller.complete_task(task, time)
             newTask = compSpot.scheduler.schedule(time)
             if newTask is not None:
-                self.controller.add_event(newTask.completionTime, newTask.receiver, newTask.service, compSpot.node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask) 
+                self._add_event(newTask.completionTime, newTask.receiver, newTask.service, compSpot.node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask) 
                 #self.controller.execute_service(newTask.flow_id, newTask.service, compSpot.node, time, compSpot.is_cloud)
             if task.taskType == Task.TASK_TYPE_VM_START:
                 return
-            delay = self.view.path_delay(node, receiver)
-            self.controller.add_event(time+delay, receiver, service, receiver, flow_id, deadline, rtt_delay, RESPONSE)
+            delay = self._path_delay[(node, receiver)]
+            self._add_event(time+delay, receiver, service, receiver, flow_id, deadline, rtt_delay, RESPONSE)
             if self.debug:
                 print("Flow id: " + str(flow_id) + " is scheduled to arrive at the receiver at time: " + str(time+delay))
             if (time+delay > deadline):
@@ -374,155 +425,79 @@ class Coordinated(Strategy):
             sys.exit("Unexpected request in Coordinated strategy")
 
 
-@register_strategy('HYBRID')
-class Hybrid(Strategy):
-    """A distributed approach for service-centric routing
+class ServiceStrategyBase(Strategy):
+    """Base class of the distributed service strategies (Hybrid, MFU and SDF)
+
+    It holds the per-node deadline metrics and the event handling the three 
+    strategies share. Subclasses replace the services of the computation 
+    spots at the end of each interval by implementing _replace().
     """
+
+    __slots__ = ('_add_event', '_add_events', '_handlers', '_next_hop', 
+                 '_path_delay', '_content_source', '_service_time', 
+                 'replacement_interval', 'n_replacements', 'last_replacement', 
+                 '_next_replacement', 'receivers', 'compSpots', '_edge_cs', 
+                 'num_nodes', 'num_services', 'debug', '_node_idx', 
+                 'deadline_metric', 'cand_deadline_metric')
     
     def __init__(self, view, controller, replacement_interval=10, debug=False, n_replacements=1, **kwargs):
-        super(Hybrid, self).__init__(view,controller)
+        super(ServiceStrategyBase, self).__init__(view,controller)
+        self._add_event = controller.add_event
+        self._add_events = controller.add_events
+        self._handlers = {REQUEST : self._on_request, RESPONSE : self._on_response, TASK_COMPLETE : self._on_task_complete}
+        self._next_hop, self._path_delay = _path_tables(view)
+        self._content_source = [view.content_source(s) for s in range(view.num_services())]
+        self._service_time = [view.services()[s].service_time for s in range(view.num_services())]
         self.replacement_interval = replacement_interval
         self.n_replacements = n_replacements
         self.last_replacement = 0
+        # services are replaced at the first event after this time
+        self._next_replacement = self.last_replacement + replacement_interval
         self.receivers = view.topology().receivers()
         self.compSpots = self.view.service_nodes()
         self.num_nodes = len(self.compSpots.keys())
+        # (node, compSpot) pairs of the edge (i.e., non-cloud) computation spots
+        self._edge_cs = [(n, cs) for n, cs in self.compSpots.items() if not cs.is_cloud]
         self.num_services = self.view.num_services()
+        # Debug traces go to the module logger, so they are only emitted if 
+        # the logging configuration enables DEBUG (e.g. LOG_LEVEL = 'DEBUG')
         self.debug = debug
-        # metric to rank each VM of Comp. Spot
-        self.deadline_metric = {x : {} for x in range(0, self.num_nodes)}
-        self.cand_deadline_metric = {x : {} for x in range(0, self.num_nodes)}
-        self.replacements_so_far = 0
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            for vm_indx in range(0, self.num_services):
-                self.deadline_metric[node][vm_indx] = 0.0
-            for service_indx in range(0, self.num_services):
-                self.cand_deadline_metric[node][service_indx] = 0.0
-    
-    # Hybrid
+        # metric to rank each VM of Comp. Spot (rows are indexed by _node_idx)
+        self._node_idx = {node : indx for indx, node in enumerate(self.compSpots.keys())}
+        self.deadline_metric = np.zeros((self.num_nodes, self.num_services))
+        self.cand_deadline_metric = np.zeros((self.num_nodes, self.num_services))
+
     def initialise_metrics(self):
         """
         Initialise metrics/counters to 0
         """
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            cs.running_requests = [0 for x in range(0, self.num_services)]
-            cs.missed_requests = [0 for x in range(0, self.num_services)]
+        for node, cs in self._edge_cs:
+            cs.running_requests.fill(0)
+            cs.missed_requests.fill(0)
             cs.scheduler.idleTime = 0.0
-            for vm_indx in range(0, self.num_services):
-                self.deadline_metric[node][vm_indx] = 0.0
-            for service_indx in range(0, self.num_services):
-                self.cand_deadline_metric[node][service_indx] = 0.0
+        self.deadline_metric.fill(0.0)
+        self.cand_deadline_metric.fill(0.0)
 
-    #HYBRID 
-    def replace_services1(self, time):
-        for node, cs in self.compSpots.items():
-            n_replacements = 0
-            if cs.is_cloud:
-                continue
-            runningServiceResidualTimes = self.deadline_metric[node]
-            missedServiceResidualTimes = self.cand_deadline_metric[node]
-            #service_residuals = []
-            running_services_utilisation_normalised = []
-            missed_services_utilisation = []
-            delay = {}
-            #runningServicesUtil = {}
-            #missedServicesUtil = {}
-
-            if len(cs.scheduler.upcomingTaskQueue) > 0:
-                print ("Printing upcoming task queue at node: " + str(cs.node))
-                for task in cs.scheduler.upcomingTaskQueue:
-                    task.print_task()
-            
-            util = []
-            util_normalised = {}
-            
-            if self.debug:
-                print ("Replacement at node " + repr(node))
-            for service in range(0, self.num_services):
-                if cs.numberOfVMInstances[service] != len(cs.scheduler.idleVMs[service]) + len(cs.scheduler.busyVMs[service]) + len(cs.scheduler.startingVMs[service]):
-                    print ("Error: number of vm instances do not match for service: " + str(service) + " node: " + str(cs.node))
-                    print ("numberOfInstances = " + str(cs.numberOfVMInstances[service]))
-                    print ("Total VMs: " + str(len(cs.scheduler.idleVMs[service]) + len(cs.scheduler.busyVMs[service]) + len(cs.scheduler.startingVMs[service])) )
-                    print ("\t Idle: " + str(len(cs.scheduler.idleVMs[service])) + " Busy: " + str(len(cs.scheduler.busyVMs[service])) + " Starting: " + str(len(cs.scheduler.startingVMs[service])) )
-                d_metric = 0.0
-                u_metric = 0.0
-                util.append([service, (cs.missed_requests[service] + cs.running_requests[service]) * cs.services[service].service_time])
-                if cs.numberOfVMInstances[service] == 0: 
-                # No instances
-                    if cs.missed_requests[service] > 0:
-                        d_metric = 1.0*missedServiceResidualTimes[service]/cs.missed_requests[service]
-                    else:
-                        d_metric = float('inf')
-                    delay[service] = d_metric
-                    u_metric = cs.missed_requests[service] * cs.services[service].service_time
-                    if u_metric > self.replacement_interval:
-                        u_metric = self.replacement_interval
-                    #missedServiceResidualTimes[service] = d_metric
-                    #missedServicesUtil[service] = u_metric
-                    missed_services_utilisation.append([service, u_metric])
-                    #service_residuals.append([service, d_metric])
-                elif cs.numberOfVMInstances[service] > 0: 
-                # At least one instance
-                    if cs.running_requests[service] > 0:
-                        d_metric = 1.0*runningServiceResidualTimes[service]/cs.running_requests[service]
-                    else:
-                        d_metric = float('inf')
-                    runningServiceResidualTimes[service] = d_metric
-                    u_metric_missed = (cs.missed_requests[service]) * cs.services[service].service_time * 1.0
-                    if u_metric_missed > self.replacement_interval:
-                        u_metric_missed = self.replacement_interval
-                    #missedServicesUtil[service] = u_metric_missed
-                    u_metric_served = (1.0*cs.running_requests[service]*cs.services[service].service_time)/cs.numberOfVMInstances[service]
-                    #runningServicesUtil[service] = u_metric_served
-                    missed_services_utilisation.append([service, u_metric_missed])
-                    #running_services_latency.append([service, d_metric])
-                    running_services_utilisation_normalised.append([service, u_metric_served/cs.numberOfVMInstances[service]])
-                    #service_residuals.append([service, d_metric])
-                    delay[service] = d_metric
-                else:
-                    print("This should not happen")
-            running_services_utilisation_normalised = sorted(running_services_utilisation_normalised, key=lambda x: x[1]) #smaller to larger
-            missed_services_utilisation = sorted(missed_services_utilisation, key=lambda x: x[1], reverse=True) #larger to smaller
-            #service_residuals = sorted(service_residuals, key=lambda x: x[1]) #smaller to larger
-            exit_loop = False
-            for service_missed, missed_util in missed_services_utilisation:
-                if exit_loop:
-                    break
-                for indx in range(len(running_services_utilisation_normalised)):
-                    service_running = running_services_utilisation_normalised[indx][0]
-                    running_util = running_services_utilisation_normalised[indx][1]
-                    if running_util > missed_util:
-                        exit_loop = True
-                        break
-                    if service_running == service_missed:
-                        continue
-                    if missed_util >= running_util and delay[service_missed] < delay[service_running] and delay[service_missed] > 0:
-                        self.controller.reassign_vm(time, cs, service_running, service_missed, self.debug)
-                        #cs.reassign_vm(self.controller, time, service_running, service_missed, self.debug)
-                        if self.debug:
-                            print ("Missed util: " + str(missed_util) + " running util: " + str(running_util) + " Adequate time missed: " + str(delay[service_missed]) + " Adequate time running: " + str(delay[service_running]))
-                        del running_services_utilisation_normalised[indx]
-                        n_replacements += 1
-                        break
-            if self.debug:
-                print(str(n_replacements) + " replacements at node:" + str(cs.node) + " at time: " + str(time))
-                for node in self.compSpots.keys():
-                    cs = self.compSpots[node]
-                    if cs.is_cloud:
-                        continue
-                    if cs.node != 14 and cs.node!=6:
-                        continue
-                    for service in range(0, self.num_services):
-                        if cs.numberOfVMInstances[service] > 0:
-                            print ("Node: " + str(node) + " has " + str(cs.numberOfVMInstances[service]) + " instance of " + str(service))
+    def _accumulate_deadline(self, node, service, metric, is_cand):
+        """
+        Add a (positive) deadline metric of a request for service at node to 
+        the metric of the candidate services if is_cand is True, or of the 
+        running services otherwise
+        """
+        if metric > 0:
+            if is_cand:
+                self.cand_deadline_metric[self._node_idx[node], service] += metric
+            else:
+                self.deadline_metric[self._node_idx[node], service] += metric
+
+    @abc.abstractmethod
+    def _replace(self, time):
+        """
+        Replace the services of the computation spots at the end of an interval
+        """
+        raise NotImplementedError('The selected strategy must implement '
+                                  'a _replace method')
 
-    #HYBRID 
     @inheritdoc(Strategy)
     def process_event(self, time, receiver, content, log, node, flow_id, deadline, rtt_delay, status, task=None):
         """
@@ -531,399 +506,287 @@ class Hybrid(Strategy):
         flow_id : Id of the flow that the request/response is part of
         node : the current node at which the request/response arrived
         """
-        #self.debug = False
-        #if node == 12:
-        #    self.debug = True
 
         service = content
-        source = self.view.content_source(service)
+        source = self._content_source[service]
 
-        if time - self.last_replacement > self.replacement_interval:
+        if time > self._next_replacement:
             #self.print_stats()
-            print("Replacement time: " + repr(time))
+            if self.debug:
+                logger.debug("Replacement time: %r", time)
             self.controller.replacement_interval_over(flow_id, self.replacement_interval, time)
-            self.replace_services1(time)
+            self._replace(time)
             self.last_replacement = time
+            self._next_replacement = time + self.replacement_interval
             self.initialise_metrics()
         
-        compSpot = None
-        if self.view.has_computationalSpot(node):
-            compSpot = self.view.compSpot(node)
+        compSpot = self.compSpots.get(node)
+        is_request = (status == REQUEST)
 
-        # Request reached the cloud
-        if source == node and status == REQUEST:
+        # Request reached the cloud
+        if source == node and is_request:
             ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
             if ret == False:
-                print("This should not happen in Hybrid.")
+                print("This should not happen in " + self.name + ".")
                 raise ValueError("Task should not be rejected at the cloud.")
             return 
 
-        # Request at the receiver
-        if receiver == node and status == REQUEST:
+        # Request at the receiver
+        if receiver == node and is_request:
             self.controller.start_session(time, receiver, service, log, flow_id, deadline)
-            path = self.view.shortest_path(node, source)
-            next_node = path[1]
-            delay = self.view.path_delay(node, next_node)
+            next_node = self._next_hop[(node, source)]
+            delay = self._path_delay[(node, next_node)]
             rtt_delay += delay*2
-            self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
+            self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
             return
 
         if self.debug:
-            print ("\nEvent\n time: " + repr(time) + " receiver  " + repr(receiver) + " service " + repr(service) + " node " + repr(node) + " flow_id " + repr(flow_id) + " deadline " + repr(deadline) + " status " + repr(status)) 
+            logger.debug("Event time: %r receiver: %r service: %r node: %r flow_id: %r deadline: %r status: %r", time, receiver, service, node, flow_id, deadline, status)
 
-        if status == RESPONSE: 
-            # response is on its way back to the receiver
-            if node == receiver:
-                self.controller.end_session(True, time, flow_id) #TODO add flow_time
-                return
-            else:
-                path = self.view.shortest_path(node, receiver)
-                next_node = path[1]
-                delay = self.view.link_delay(node, next_node)
-                path_del = self.view.path_delay(node, receiver)
-                self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
-                if path_del + time > deadline:
-                    compSpot.missed_requests[service] += 1 
+        handler = self._handlers.get(status)
+        if handler is None:
+            print ("Error: unrecognised status value : " + repr(status))
+            return
+        handler(time, receiver, service, node, flow_id, deadline, rtt_delay, compSpot, source, task)
 
-        elif status == TASK_COMPLETE:
-            self.controller.complete_task(task, time)
-            if node != source:
-                newTask = compSpot.scheduler.schedule(time)
-                #schedule the next queued task at this node
-                if newTask is not None:
-                    self.controller.add_event(newTask.completionTime, newTask.receiver, newTask.service, node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask)
-                        
-            # forward the completed task 
-            if task.taskType == Task.TASK_TYPE_VM_START:
-                return
-            path = self.view.shortest_path(node, receiver)
-            path_delay = self.view.path_delay(node, receiver)
-            next_node = path[1]
+    def _on_response(self, time, receiver, service, node, flow_id, deadline, rtt_delay, compSpot, source, task):
+        """
+        Handle a response on its way back to the receiver
+        """
+        # response is on its way back to the receiver
+        if node == receiver:
+            self.controller.end_session(True, time, flow_id) #TODO add flow_time
+            return
+        else:
+            next_node = self._next_hop[(node, receiver)]
             delay = self.view.link_delay(node, next_node)
-            self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
-            if (node != source and time + path_delay > deadline):
-                print ("Error in HYBRID strategy: Request missed its deadline\nResponse at receiver at time: " + str(time+path_delay) + " deadline: " + str(deadline))
-                task.print_task()
-                #raise ValueError("This should not happen: a task missed its deadline after being executed at an edge node.")
-            
-        elif status == REQUEST:
-            # Processing a request
-            source = self.view.content_source(service)
-            path = self.view.shortest_path(node, source)
-            next_node = path[1]
-            delay = self.view.path_delay(node, next_node)
-            deadline_metric = (deadline - time - rtt_delay - compSpot.services[service].service_time) #/deadline
+            self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
+
+    def _on_task_complete(self, time, receiver, service, node, flow_id, deadline, rtt_delay, compSpot, source, task):
+        """
+        Handle the completion of a task at node and forward its response
+        """
+        self.controller.complete_task(task, time)
+        events = []
+        if node != source:
+            newTask = compSpot.scheduler.schedule(time)
+            #schedule the next queued task at this node
+            if newTask is not None:
+                events.append((newTask.completionTime, newTask.receiver, newTask.service, node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask))
+
+        # forward the completed task
+        if task.taskType == Task.TASK_TYPE_VM_START:
+            self._add_events(events)
+            return
+        path_delay = self._path_delay[(node, receiver)]
+        next_node = self._next_hop[(node, receiver)]
+        delay = self.view.link_delay(node, next_node)
+        events.append((time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE))
+        self._add_events(events)
+        if (node != source and time + path_delay > deadline):
+            print ("Error in " + self.name + " strategy: Request missed its deadline\nResponse at receiver at time: " + str(time+path_delay) + " deadline: " + str(deadline))
+            task.print_task()
+            #raise ValueError("This should not happen: a task missed its deadline after being executed at an edge node.")
+
+    def _on_request(self, time, receiver, service, node, flow_id, deadline, rtt_delay, compSpot, source, task):
+        """
+        Admit a request at node or pass it upstream
+        """
+        # Processing a request
+        next_node = self._next_hop[(node, source)]
+        delay = self._path_delay[(node, next_node)]
+        deadline_metric = (deadline - time - rtt_delay - self._service_time[service])/deadline
+        if self.debug:
+            logger.debug("Deadline metric: %r", deadline_metric)
+        if compSpot is not None and (compSpot.is_cloud or compSpot.numberOfVMInstances[service] > 0):
             if self.debug:
-                print ("Deadline metric: " + repr(deadline_metric))
-            if self.view.has_service(node, service):
-                if self.debug:
-                    print ("Calling admit_task")
-                ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
-                if self.debug:
-                    print ("Done Calling admit_task")
-                if ret is False:    
-                    # Pass the Request upstream
-                    rtt_delay += delay*2
-                    self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-                    if deadline_metric > 0:
-                        self.cand_deadline_metric[node][service] += deadline_metric
-                    if self.debug:
-                        print ("Pass upstream to node: " + repr(next_node))
-                    #compSpot.missed_requests[service] += 1 # Added here
-                else:
-                    if deadline_metric > 0:
-                        self.deadline_metric[node][service] += deadline_metric
-            else: #Not running the service
-                #compSpot.missed_requests[service] += 1
-                if self.debug:
-                    print ("Not running the service: Pass upstream to node: " + repr(next_node))
+                logger.debug("Calling admit_task")
+            ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
+            if self.debug:
+                logger.debug("Done Calling admit_task")
+            if ret is False:    
+                # Pass the Request upstream
                 rtt_delay += delay*2
-                self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-                if deadline_metric > 0:
-                    self.cand_deadline_metric[node][service] += deadline_metric
-        else:
-            print ("Error: unrecognised status value : " + repr(status))
+                self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
+                self._accumulate_deadline(node, service, deadline_metric, True)
+                if self.debug:
+                    logger.debug("Pass upstream to node: %r", next_node)
+            else:
+                self._accumulate_deadline(node, service, deadline_metric, False)
+        else: #Not running the service
+            compSpot.missed_requests[service] += 1
+            if self.debug:
+                logger.debug("Not running the service: Pass upstream to node: %r", next_node)
+            rtt_delay += delay*2
+            self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
+            self._accumulate_deadline(node, service, deadline_metric, True)
 
 
-# Highest Utilisation First Strategy 
-@register_strategy('MFU')
-class MostFrequentlyUsed(Strategy):
+@register_strategy('HYBRID')
+class Hybrid(ServiceStrategyBase):
     """A distributed approach for service-centric routing
     """
+
+    __slots__ = ('replacements_so_far',)
     
     def __init__(self, view, controller, replacement_interval=10, debug=False, n_replacements=1, **kwargs):
-        super(MostFrequentlyUsed, self).__init__(view,controller)
-        self.replacement_interval = replacement_interval
-        self.n_replacements = n_replacements
-        self.last_replacement = 0
-        self.receivers = view.topology().receivers()
-        self.compSpots = self.view.service_nodes()
-        self.num_nodes = len(self.compSpots.keys())
-        self.num_services = self.view.num_services()
-        self.debug = debug
-        # metric to rank each VM of Comp. Spot
-        self.deadline_metric = {x : {} for x in range(0, self.num_nodes)}
-        self.cand_deadline_metric = {x : {} for x in range(0, self.num_nodes)}
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            for vm_indx in range(0, self.num_services):
-                self.deadline_metric[node][vm_indx] = 0.0
-            for service_indx in range(0, self.num_services):
-                self.cand_deadline_metric[node][service_indx] = 0.0
-    
-    # MFU
-    def initialise_metrics(self):
-        """
-        Initialise metrics/counters to 0
-        """
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            cs.running_requests = [0 for x in range(0, self.num_services)]
-            cs.missed_requests = [0 for x in range(0, self.num_services)]
-            cs.scheduler.idleTime = 0.0
-            for vm_indx in range(0, self.num_services):
-                self.deadline_metric[node][vm_indx] = 0.0
-            for service_indx in range(0, self.num_services):
-                self.cand_deadline_metric[node][service_indx] = 0.0
-    # MFU
-    def replace_services(self, k, time):
-        """
-        This method does the following:
-        1. Evaluate instantiated and stored services at each computational spot for the past time interval, ie, [t-interval, t]. 
-        2. Decide which services to instantiate in the next time interval [t, t+interval].
-        Parameters:
-        k : max number of instances to replace at each computational spot
-        interval: the length of interval
-        """
-
-        for node, cs in self.compSpots.items():
-            if cs.is_cloud:
-                continue
-            n_replacements = k
-            vms = []
-            cand_services = []
-            vm_metrics = self.deadline_metric[node]
-            cand_metric = self.cand_deadline_metric[node]
-            if self.debug:
-                print ("Replacement at node " + repr(node))
-            for service in range(0, self.num_services):
-                usage_metric = 0.0
-                if cs.numberOfVMInstances[service] == 0:
-                    if self.debug:
-                        print ("No running instances of service: " + repr(service)) 
-                    continue
-                if cs.running_requests[service] == 0:
-                    usage_metric = 0.0 
-                    if self.debug:
-                        print ("No scheduled requests for service: " + repr(service)) 
-                else:
-                    usage_metric = cs.running_requests[service] * cs.services[service].service_time
-                    if self.debug:
-                        print ("Usage metric for service: " + repr(service) + " is " + repr(usage_metric))
+        super(Hybrid, self).__init__(view, controller, replacement_interval, debug, n_replacements, **kwargs)
+        self.replacements_so_far = 0
 
-                vms.append([service, usage_metric])
+    #HYBRID 
+    def replace_services1(self, time):
+        for node, cs in self._edge_cs:
+            n_replacements = 0
+            runningServiceResidualTimes = self.deadline_metric[self._node_idx[node]]
+            missedServiceResidualTimes = self.cand_deadline_metric[self._node_idx[node]]
+            if self.debug and len(cs.scheduler.upcomingTaskQueue) > 0:
+                logger.debug("Upcoming task queue at node %r (service, type, flow_id, arrival time, deadline): %r", cs.node, 
+                             [(task.service, task.taskType, task.flow_id, task.arrivalTime, task.expiry) for task in cs.scheduler.upcomingTaskQueue])
             
-            for service in range(0, self.num_services):
-                #if cs.numberOfVMInstances[service] > 0:
-                #    continue
-                if cs.missed_requests[service] == 0:
-                    usage_metric = 0.0
-                else:
-                    usage_metric = cs.missed_requests[service] * cs.services[service].service_time
-                    if self.debug:
-                        print ("Usage metric for Upstream Service: " + repr(service) + " is " + repr(usage_metric))
-                    cand_services.append([service, usage_metric])
-
-            # sort vms and virtual_vms arrays according to metric
-            vms = sorted(vms, key=lambda x: x[1]) #small to large
-            cand_services = sorted(cand_services, key=lambda x: x[1], reverse=True) #large to small
             if self.debug:
-                print ("VMs: " + repr(vms))
-                print ("Cand. Services: " + repr(cand_services))
-            # Small metric is better
-            indx = 0
-            for vm in vms: 
-                if indx >= len(cand_services):
-                    break
-                if vm[1] > cand_services[indx][1]:
-                    break
-                else:
-                    # Are they the same service? This should not happen really
-                    if vm[0] != cand_services[indx][0]:
-                        self.controller.reassign_vm(time, cs, vm[0], cand_services[indx][0], self.debug)
-                        #cs.reassign_vm(self.controller, time, vm[0], cand_services[indx][0], self.debug)
-                        n_replacements -= 1
-                
-                if n_replacements == 0 or indx == len(cand_services):
+                logger.debug("Replacement at node %r", node)
+            idleVMs = cs.scheduler.idleVMs
+            busyVMs = cs.scheduler.busyVMs
+            startingVMs = cs.scheduler.startingVMs
+            for service in range(0, self.num_services):
+                if cs.numberOfVMInstances[service] != len(idleVMs[service]) + len(busyVMs[service]) + len(startingVMs[service]):
+                    print ("Error: number of vm instances do not match for service: " + str(service) + " node: " + str(cs.node))
+                    print ("numberOfInstances = " + str(cs.numberOfVMInstances[service]))
+                    print ("Total VMs: " + str(len(idleVMs[service]) + len(busyVMs[service]) + len(startingVMs[service])) )
+                    print ("\t Idle: " + str(len(idleVMs[service])) + " Busy: " + str(len(busyVMs[service])) + " Starting: " + str(len(startingVMs[service])) )
+            inst = np.asarray(cs.numberOfVMInstances)
+            miss = cs.missed_requests
+            run = cs.running_requests
+            if (inst < 0).any():
+                print("This should not happen")
+            running = np.flatnonzero(inst > 0)
+            # Mean residual time of the requests served (services with VMs) 
+            # or missed (services without VMs); inf if there were none
+            counts = np.where(inst > 0, run, miss)
+            residuals = np.where(inst > 0, runningServiceResidualTimes, missedServiceResidualTimes)
+            delay = np.full(self.num_services, np.inf)
+            delay[counts > 0] = residuals[counts > 0]/counts[counts > 0]
+            runningServiceResidualTimes[running] = delay[running]
+            delay = delay.tolist()
+            # Utilisation of missed requests (capped at the interval) for every 
+            # service and the normalised utilisation of the running services
+            service_times = cs.service_times
+            missed_utils = np.minimum(miss*service_times, self.replacement_interval)
+            running_utils = (run[running]*service_times[running])/inst[running]/inst[running]
+
+            order = np.argsort(running_utils, kind='mergesort') #smaller to larger
+            running_services_utilisation_normalised = [[service, util] for service, util in zip(running[order].tolist(), running_utils[order].tolist())]
+            order = np.argsort(-missed_utils, kind='mergesort') #larger to smaller
+            missed_services_utilisation = zip(order.tolist(), missed_utils[order].tolist())
+            exit_loop = False
+            for service_missed, missed_util in missed_services_utilisation:
+                if exit_loop:
                     break
-                indx += 1
+                for indx in range(len(running_services_utilisation_normalised)):
+                    service_running = running_services_utilisation_normalised[indx][0]
+                    running_util = running_services_utilisation_normalised[indx][1]
+                    if running_util > missed_util:
+                        exit_loop = True
+                        break
+                    if service_running == service_missed:
+                        continue
+                    if missed_util >= running_util and delay[service_missed] < delay[service_running] and delay[service_missed] > 0:
+                        self.controller.reassign_vm(time, cs, service_running, service_missed, self.debug)
+                        #cs.reassign_vm(self.controller, time, service_running, service_missed, self.debug)
+                        if self.debug:
+                            logger.debug("Missed util: %r running util: %r Adequate time missed: %r Adequate time running: %r", missed_util, running_util, delay[service_missed], delay[service_running])
+                        del running_services_utilisation_normalised[indx]
+                        n_replacements += 1
+                        break
+            if self.debug:
+                logger.debug("%d replacements at node: %r at time: %r", n_replacements, cs.node, time)
+                for node, cs in self._edge_cs:
+                    if cs.node != 14 and cs.node!=6:
+                        continue
+                    for service in range(0, self.num_services):
+                        if cs.numberOfVMInstances[service] > 0:
+                            logger.debug("Node: %r has %r instance of %r", node, cs.numberOfVMInstances[service], service)
 
-    # MFU
-    @inheritdoc(Strategy)
-    def process_event(self, time, receiver, content, log, node, flow_id, deadline, rtt_delay, status, task=None):
+    #HYBRID 
+    @inheritdoc(ServiceStrategyBase)
+    def _replace(self, time):
+        self.replace_services1(time)
+
+    #HYBRID
+    def _on_response(self, time, receiver, service, node, flow_id, deadline, rtt_delay, compSpot, source, task):
         """
-        response : True, if this is a response from the cloudlet/cloud
-        deadline : deadline for the request 
-        flow_id : Id of the flow that the request/response is part of
-        node : the current node at which the request/response arrived
+        Handle a response on its way back to the receiver
         """
-        
-        service = content
-        source = self.view.content_source(service)
-
-        if time - self.last_replacement > self.replacement_interval:
-            #self.print_stats()
-            self.controller.replacement_interval_over(flow_id, self.replacement_interval, time)
-            self.replace_services(self.n_replacements, time)
-            self.last_replacement = time
-            self.initialise_metrics()
-        
-        compSpot = None
-        if self.view.has_computationalSpot(node):
-            compSpot = self.view.compSpot(node)
-        
-        # Request reached the cloud
-        if source == node and status == REQUEST:
-            ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
-            if ret == False:
-                print("This should not happen in Hybrid.")
-                raise ValueError("Task should not be rejected at the cloud.")
-            return 
-
-        # Request at the receiver
-        if receiver == node and status == REQUEST:
-            self.controller.start_session(time, receiver, service, log, flow_id, deadline)
-            source = self.view.content_source(service)
-            path = self.view.shortest_path(node, source)
-            next_node = path[1]
-            delay = self.view.path_delay(node, next_node)
-            rtt_delay += delay*2
-            self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
+        # response is on its way back to the receiver
+        if node == receiver:
+            self.controller.end_session(True, time, flow_id) #TODO add flow_time
             return
+        else:
+            next_node = self._next_hop[(node, receiver)]
+            delay = self.view.link_delay(node, next_node)
+            path_del = self._path_delay[(node, receiver)]
+            self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
+            if path_del + time > deadline:
+                compSpot.missed_requests[service] += 1 
 
+    #HYBRID
+    def _on_request(self, time, receiver, service, node, flow_id, deadline, rtt_delay, compSpot, source, task):
+        """
+        Admit a request at node or pass it upstream
+        """
+        # Processing a request
+        next_node = self._next_hop[(node, source)]
+        delay = self._path_delay[(node, next_node)]
+        deadline_metric = (deadline - time - rtt_delay - self._service_time[service]) #/deadline
         if self.debug:
-            print ("\nEvent\n time: " + repr(time) + " receiver  " + repr(receiver) + " service " + repr(service) + " node " + repr(node) + " flow_id " + repr(flow_id) + " deadline " + repr(deadline) + " status " + repr(status)) 
-
-        # MFU
-        if status == RESPONSE: 
-            # response is on its way back to the receiver
-            if node == receiver:
-                self.controller.end_session(True, time, flow_id) #TODO add flow_time
-                return
-            else:
-                path = self.view.shortest_path(node, receiver)
-                next_node = path[1]
-                delay = self.view.link_delay(node, next_node)
-                self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
-
-        elif status == TASK_COMPLETE:
-            self.controller.complete_task(task, time)
-            if node != source:
-                newTask = compSpot.scheduler.schedule(time)
-                #schedule the next queued task at this node
-                if newTask is not None:
-                    self.controller.add_event(newTask.completionTime, newTask.receiver, newTask.service, node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask)
-
-            # forward the completed task
-            if task.taskType == Task.TASK_TYPE_VM_START:
-                return
-            path = self.view.shortest_path(node, receiver)
-            path_delay = self.view.path_delay(node, receiver)
-            next_node = path[1]
-            delay = self.view.link_delay(node, next_node)
-            self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE, task)
-            if (node != source and time + path_delay > deadline):
-                print ("Error in MFU strategy: Request missed its deadline\nResponse at receiver at time: " + str(time+path_delay) + " deadline: " + str(deadline))
-                task.print_task()
-                #raise ValueError("This should not happen: a task missed its deadline after being executed at an edge node.")
-            
-        # MFU
-        elif status == REQUEST:
-            # Processing a request
-            source = self.view.content_source(service)
-            path = self.view.shortest_path(node, source)
-            next_node = path[1]
-            delay = self.view.path_delay(node, next_node)
-            deadline_metric = (deadline - time - rtt_delay - compSpot.services[service].service_time)/deadline
+            logger.debug("Deadline metric: %r", deadline_metric)
+        if compSpot is not None and (compSpot.is_cloud or compSpot.numberOfVMInstances[service] > 0):
             if self.debug:
-                print ("Deadline metric: " + repr(deadline_metric))
-            if self.view.has_service(node, service):
-                if self.debug:
-                    print ("Calling admit_task")
-                ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
-                if self.debug:
-                    print ("Done Calling admit_task")
-                if ret is False:    
-                    # Pass the Request upstream
-                    rtt_delay += delay*2
-                    self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-                    if deadline_metric > 0:
-                        self.cand_deadline_metric[node][service] += deadline_metric
-                    if self.debug:
-                        print ("Pass upstream to node: " + repr(next_node))
-                else:
-                    if deadline_metric > 0:
-                        self.deadline_metric[node][service] += deadline_metric
-            else: #Not running the service
-                compSpot.missed_requests[service] += 1
-                if self.debug:
-                    print ("Not running the service: Pass upstream to node: " + repr(next_node))
+                logger.debug("Calling admit_task")
+            ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
+            if self.debug:
+                logger.debug("Done Calling admit_task")
+            if ret is False:    
+                # Pass the Request upstream
                 rtt_delay += delay*2
-                self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-                if deadline_metric > 0:
-                    self.cand_deadline_metric[node][service] += deadline_metric
-        else:
-            print ("Error: unrecognised status value : " + repr(status))
+                self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
+                self._accumulate_deadline(node, service, deadline_metric, True)
+                if self.debug:
+                    logger.debug("Pass upstream to node: %r", next_node)
+                #compSpot.missed_requests[service] += 1 # Added here
+            else:
+                self._accumulate_deadline(node, service, deadline_metric, False)
+        else: #Not running the service
+            #compSpot.missed_requests[service] += 1
+            if self.debug:
+                logger.debug("Not running the service: Pass upstream to node: %r", next_node)
+            rtt_delay += delay*2
+            self._add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
+            self._accumulate_deadline(node, service, deadline_metric, True)
 
-# Strictest Deadline First Strategy
-@register_strategy('SDF')
-class StrictestDeadlineFirst(Strategy):
-    """ A distributed approach for service-centric routing
+
+class RankedReplacementBase(ServiceStrategyBase):
+    """Base class of the strategies (MFU and SDF) that replace the VMs of a 
+    computation spot by pairing them, in rank order, with candidate services.
+    Subclasses implement the ranking in _rank_vms_and_candidates().
     """
-    # SDF  
-    def __init__(self, view, controller, replacement_interval=10, debug=False, n_replacements=1, **kwargs):
-        super(StrictestDeadlineFirst, self).__init__(view,controller)
-        self.replacement_interval = replacement_interval
-        self.n_replacements = n_replacements
-        self.last_replacement = 0
-        self.receivers = view.topology().receivers()
-        self.compSpots = self.view.service_nodes()
-        self.num_nodes = len(self.compSpots.keys())
-        self.num_services = self.view.num_services()
-        self.debug = debug
-        # metric to rank each VM of Comp. Spot
-        self.deadline_metric = {x : {} for x in range(0, self.num_nodes)}
-        self.cand_deadline_metric = {x : {} for x in range(0, self.num_nodes)}
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            for vm_indx in range(0, self.num_services):
-                self.deadline_metric[node][vm_indx] = 0.0
-            for service_indx in range(0, self.num_services):
-                self.cand_deadline_metric[node][service_indx] = 0.0
-    
-    # SDF  
-    def initialise_metrics(self):
+
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def _rank_vms_and_candidates(self, node, cs):
         """
-        Initialise metrics/counters to 0
+        Rank the services running at computation spot cs of node and the 
+        candidate services to replace them with.
+
+        Return (vm_services, vm_vals, cand_services, cand_vals): the VMs are 
+        ordered best first to be replaced and the candidates best first to be
+        instantiated. A VM is replaced by the candidate of the same rank as 
+        long as its value does not exceed that of the candidate.
         """
-        for node in self.compSpots.keys():
-            cs = self.compSpots[node]
-            if cs.is_cloud:
-                continue
-            cs.running_requests = [0 for x in range(0, self.num_services)]
-            cs.missed_requests = [0 for x in range(0, self.num_services)]
-            cs.scheduler.idleTime = 0.0
-            for vm_indx in range(0, self.num_services):
-                self.deadline_metric[node][vm_indx] = 0.0
-            for service_indx in range(0, self.num_services):
-                self.cand_deadline_metric[node][service_indx] = 0.0
-    # SDF  
+        raise NotImplementedError('The selected strategy must implement '
+                                  'a _rank_vms_and_candidates method')
+
     def replace_services(self, k, time):
         """
         This method does the following:
@@ -934,181 +797,81 @@ class StrictestDeadlineFirst(Strategy):
         interval: the length of interval
         """
 
-        for node, cs in self.compSpots.items():
-            if cs.is_cloud:
-                continue
-            n_replacements = k
-            vms = []
-            cand_services = []
-            vm_metrics = self.deadline_metric[node]
-            cand_metric = self.cand_deadline_metric[node]
+        for node, cs in self._edge_cs:
             if self.debug:
-                print ("Replacement at node " + repr(node))
-            for service in range(0, self.num_services):
-                if cs.numberOfVMInstances[service] == 0:
-                    if self.debug:
-                        print ("No running instances of service: " + repr(service)) 
-                    continue
-                d_metric = 0.0
-                if cs.running_requests[service] == 0:
-                    d_metric = 1.0 
-                    if self.debug:
-                        print ("No scheduled requests for service: " + repr(service)) 
-                else:
-                    d_metric = vm_metrics[service]/cs.running_requests[service]
-                    if self.debug:
-                        print ("Deadline metric for service: " + repr(service) + " is " + repr(d_metric))
-
-                vms.append([service, d_metric])
-            # SDF  
-            for service in range(0, self.num_services):
-                #if self.debug:
-                #    print ("\tNumber of Requests for upstream service " + repr(service) + " is "  + repr(cs.missed_requests[service]))
-                d_metric = 0.0
-                if cs.missed_requests[service] == 0:
-                    d_metric = 1.0
-                else:
-                    d_metric = cand_metric[service]/cs.missed_requests[service]
-                    if self.debug:
-                        print ("Deadline metric for Upstream Service: " + repr(service) + " is " + repr(d_metric))
-                    cand_services.append([service, d_metric])
-            # sort vms and virtual_vms arrays according to metric
-            vms = sorted(vms, key=lambda x: x[1], reverse=True) #larger to smaller
-            cand_services = sorted(cand_services, key=lambda x: x[1]) #smaller to larger
+                logger.debug("Replacement at node %r", node)
+            vm_services, vm_vals, cand_services, cand_vals = self._rank_vms_and_candidates(node, cs)
             if self.debug:
-                print ("VMs: " + repr(vms))
-                print ("Cand. Services: " + repr(cand_services))
-            # Small metric is better
-            indx = 0
-            for vm in vms:
-                # vm's metric is worse than the cand. and they are not the same service
-                if indx >= len(cand_services):
-                    break
-                if vm[1] < cand_services[indx][1]:
-                    break
-                else:
-                    if vm[0] != cand_services[indx][0]:
-                        self.controller.reassign_vm(time, cs, vm[0], cand_services[indx][0], self.debug)
-                        #cs.reassign_vm(self.controller, time, vm[0], cand_services[indx][0], self.debug)
-                        n_replacements -= 1
-                
-                if n_replacements == 0 or indx == len(cand_services):
-                    break
-                indx += 1
-    # SDF  
-    @inheritdoc(Strategy)
-    def process_event(self, time, receiver, content, log, node, flow_id, deadline, rtt_delay, status, task=None):
-        """
-        response : True, if this is a response from the cloudlet/cloud
-        deadline : deadline for the request 
-        flow_id : Id of the flow that the request/response is part of
-        node : the current node at which the request/response arrived
-        """
+                logger.debug("VMs: %r", zip(vm_services.tolist(), vm_vals.tolist()))
+                logger.debug("Cand. Services: %r", zip(cand_services.tolist(), cand_vals.tolist()))
+            services_out, services_in = _plan_replacements(vm_services, vm_vals, cand_services, cand_vals, k)
+            self.controller.reassign_vms(time, cs, zip(services_out.tolist(), services_in.tolist()), self.debug)
 
-        service = content
-        source = self.view.content_source(service)
+    @inheritdoc(ServiceStrategyBase)
+    def _replace(self, time):
+        self.replace_services(self.n_replacements, time)
 
-        if time - self.last_replacement > self.replacement_interval:
-            #self.print_stats()
-            self.controller.replacement_interval_over(flow_id, self.replacement_interval, time)
-            self.replace_services(self.n_replacements, time)
-            self.last_replacement = time
-            self.initialise_metrics()
-        
-        compSpot = None
-        if self.view.has_computationalSpot(node):
-            compSpot = self.view.compSpot(node)
 
-        # Request reached the cloud
-        if source == node and status == REQUEST:
-            ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
-            if ret == False:
-                print("This should not happen in Hybrid.")
-                raise ValueError("Task should not be rejected at the cloud.")
-            return 
+# Highest Utilisation First Strategy 
+@register_strategy('MFU')
+class MostFrequentlyUsed(RankedReplacementBase):
+    """A distributed approach for service-centric routing
+    """
 
-        # Request at the receiver
-        if receiver == node and status == REQUEST:
-            self.controller.start_session(time, receiver, service, log, flow_id, deadline)
-            source = self.view.content_source(service)
-            path = self.view.shortest_path(node, source)
-            next_node = path[1]
-            delay = self.view.path_delay(node, next_node)
-            rtt_delay += delay*2
-            self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-            return
+    __slots__ = ()
 
-        if self.debug:
-            print ("\nEvent\n time: " + repr(time) + " receiver  " + repr(receiver) + " service " + repr(service) + " node " + repr(node) + " flow_id " + repr(flow_id) + " deadline " + repr(deadline) + " status " + repr(status)) 
+    # MFU
+    def _rank_vms_and_candidates(self, node, cs):
+        """
+        Rank the services with VMs by increasing usage (requests served times 
+        service time) and the services with missed requests by decreasing 
+        usage
+        """
+        inst = np.asarray(cs.numberOfVMInstances)
+        running = cs.running_requests
+        missed = cs.missed_requests
+        # usage of the services with VMs, and of the services with missed requests
+        vm_services = np.flatnonzero(inst != 0)
+        vm_usage = running[vm_services] * cs.service_times[vm_services]
+        missed_services = np.flatnonzero(missed != 0)
+        cand_usage = missed[missed_services] * cs.service_times[missed_services]
+        # stable sorts, so that ties keep the order of the service ids
+        vm_order = np.argsort(vm_usage, kind='mergesort') #small to large
+        cand_order = np.argsort(-cand_usage, kind='mergesort') #large to small
+        return vm_services[vm_order], vm_usage[vm_order], missed_services[cand_order], cand_usage[cand_order]
 
-        # SDF  
-        if status == RESPONSE: 
-            # response is on its way back to the receiver
-            if node == receiver:
-                self.controller.end_session(True, time, flow_id) #TODO add flow_time
-                return
-            else:
-                path = self.view.shortest_path(node, receiver)
-                next_node = path[1]
-                delay = self.view.link_delay(node, next_node)
-                self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
+# Strictest Deadline First Strategy
+@register_strategy('SDF')
+class StrictestDeadlineFirst(RankedReplacementBase):
+    """ A distributed approach for service-centric routing
+    """
 
-        elif status == TASK_COMPLETE:
-            self.controller.complete_task(task, time)
-            if node != source:
-                newTask = compSpot.scheduler.schedule(time)
-                #schedule the next queued task at this node
-                if newTask is not None:
-                    self.controller.add_event(newTask.completionTime, newTask.receiver, newTask.service, node, newTask.flow_id, newTask.expiry, newTask.rtt_delay, TASK_COMPLETE, newTask)
-            
-            # forward the completed task
-            if task.taskType == Task.TASK_TYPE_VM_START:
-                return
-            path = self.view.shortest_path(node, receiver)
-            path_delay = self.view.path_delay(node, receiver)
-            next_node = path[1]
-            delay = self.view.link_delay(node, next_node)
-            self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, RESPONSE)
-            if (node != source and time + path_delay > deadline):
-                print ("Error in SDF strategy: Request missed its deadline\nResponse at receiver at time: " + str(time+path_delay) + " deadline: " + str(deadline))
-                task.print_task()
-                #raise ValueError("This should not happen: a task missed its deadline after being executed at an edge node.")
-            
-        # SDF  
-        elif status == REQUEST:
-            # Processing a request
-            source = self.view.content_source(service)
-            path = self.view.shortest_path(node, source)
-            next_node = path[1]
-            delay = self.view.path_delay(node, next_node)
-            deadline_metric = (deadline - time - rtt_delay - compSpot.services[service].service_time)/deadline
-            if self.debug:
-                print ("Deadline metric: " + repr(deadline_metric))
-            if self.view.has_service(node, service):
-                if self.debug:
-                    print ("Calling admit_task")
-                ret, reason = compSpot.admit_task(service, time, flow_id, deadline, receiver, rtt_delay, self.controller, self.debug)
-                if self.debug:
-                    print ("Done Calling admit_task")
-                if ret is False:    
-                    # Pass the Request upstream
-                    rtt_delay += delay*2
-                    self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-                    if deadline_metric > 0:
-                        self.cand_deadline_metric[node][service] += deadline_metric
-                    if self.debug:
-                        print ("Pass upstream to node: " + repr(next_node))
-                else:
-                    if deadline_metric > 0:
-                        self.deadline_metric[node][service] += deadline_metric
-            else: #Not running the service
-                compSpot.missed_requests[service] += 1
-                if self.debug:
-                    print ("Not running the service: Pass upstream to node: " + repr(next_node))
-                rtt_delay += delay*2
-                self.controller.add_event(time+delay, receiver, service, next_node, flow_id, deadline, rtt_delay, REQUEST)
-                if deadline_metric > 0:
-                    self.cand_deadline_metric[node][service] += deadline_metric
-        else:
-            print ("Error: unrecognised status value : " + repr(status))
+    __slots__ = ()
 
+    # SDF  
+    def _rank_vms_and_candidates(self, node, cs):
+        """
+        Rank the services with VMs by decreasing mean deadline metric (the 
+        least urgent first) and the services with missed requests by 
+        increasing mean deadline metric. The metrics are returned negated, so 
+        that the VM is replaced as long as its value does not exceed the 
+        candidate's.
+        """
+        vm_metrics = self.deadline_metric[self._node_idx[node]]
+        cand_metric = self.cand_deadline_metric[self._node_idx[node]]
+        inst = np.asarray(cs.numberOfVMInstances)
+        running = cs.running_requests
+        missed = cs.missed_requests
+        # mean deadline metric of the services with VMs (1.0 if no 
+        # requests were scheduled), and of the services with missed requests
+        vm_services = np.flatnonzero(inst != 0)
+        vm_running = running[vm_services]
+        vm_deadline = np.ones(len(vm_services))
+        scheduled = vm_running != 0
+        vm_deadline[scheduled] = vm_metrics[vm_services[scheduled]]/vm_running[scheduled]
+        missed_services = np.flatnonzero(missed != 0)
+        cand_deadline = cand_metric[missed_services]/missed[missed_services]
+        # stable sorts, so that ties keep the order of the service ids
+        vm_order = np.argsort(-vm_deadline, kind='mergesort') #larger to smaller
+        cand_order = np.argsort(cand_deadline, kind='mergesort') #smaller to larger
+        return vm_services[vm_order], -vm_deadline[vm_order], missed_services[cand_order], -cand_deadline[cand_order]
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
+import heapq
+import random
 import unittest
+from math import ceil
 
 import fnss
+import numpy as np
 
 from icarus.scenarios import IcnTopology
 import icarus.models as strategy
 from icarus.execution import NetworkModel, NetworkView, NetworkController, DummyCollector
+from icarus.models.strategy.service import _allocate_vms, _distribute_vms, _plan_replacements
 
 
 class TestHashroutingEdge(unittest.TestCase):
@@ -1893,3 +1898,138 @@ class TestNrr(unittest.TestCase):
         self.assertSetEqual(set(exp_req_hops), set(summary['request_hops']))
         self.assertSetEqual(set(exp_cont_hops), set(summary['content_hops']))
         self.assertEqual(3, summary['serving_node'])
+
+
+class TestPlanReplacements(unittest.TestCase):
+
+    def test_pairs_until_vm_metric_is_larger(self):
+        vm_services = np.array([0, 1, 2])
+        vm_vals = np.array([1.0, 2.0, 5.0])
+        cand_services = np.array([3, 4, 5])
+        cand_vals = np.array([4.0, 3.0, 2.0])
+        out, inn = _plan_replacements(vm_services, vm_vals, cand_services, cand_vals, 3)
+        self.assertEqual([0, 1], out.tolist())
+        self.assertEqual([3, 4], inn.tolist())
+
+    def test_skips_same_service_and_caps_at_k(self):
+        vm_services = np.array([0, 1, 2])
+        vm_vals = np.array([1.0, 1.0, 1.0])
+        cand_services = np.array([0, 4, 5])
+        cand_vals = np.array([2.0, 2.0, 2.0])
+        out, inn = _plan_replacements(vm_services, vm_vals, cand_services, cand_vals, 1)
+        self.assertEqual([1], out.tolist())
+        self.assertEqual([4], inn.tolist())
+
+    def test_no_candidates(self):
+        out, inn = _plan_replacements(np.array([0, 1]), np.array([1.0, 2.0]),
+                                      np.array([], dtype=int), np.array([]), 2)
+        self.assertEqual(0, len(out))
+        self.assertEqual(0, len(inn))
+
+
+class TestDistributeVms(unittest.TestCase):
+
+    @staticmethod
+    def distribute_vms_loop(deployed_vms, utils, remaining_vms, interval):
+        # The round-by-round distribution that _distribute_vms replaces
+        vms = list(deployed_vms)
+        while remaining_vms > 0:
+            added = False
+            for indx, util in enumerate(utils):
+                if vms[indx] > 0:
+                    vms[indx] += 1
+                    remaining_vms -= 1
+                    added = True
+                else:
+                    num_vms = min(int(ceil(util/interval)), remaining_vms)
+                    if num_vms > 0:
+                        vms[indx] = num_vms
+                        remaining_vms -= num_vms
+                        added = True
+                if remaining_vms == 0:
+                    break
+            if not added:
+                break
+        return vms
+
+    def assert_matches_loop(self, deployed_vms, utils, remaining_vms, interval=5.0):
+        expected = self.distribute_vms_loop(deployed_vms, utils, remaining_vms, interval)
+        vms = _distribute_vms(np.array(deployed_vms), np.array(utils), remaining_vms, interval)
+        self.assertEqual(expected, vms.tolist())
+        return expected
+
+    def test_table(self):
+        cases = [
+            # (deployed_vms, utils, remaining_vms, expected)
+            # no spare VMs (numOfVMs == 0)
+            ([0, 0], [10.0, 3.0], 0, [0, 0]),
+            # no services
+            ([], [], 3, []),
+            # nothing has utilisation: no VM is deployed
+            ([0, 0], [0.0, 0.0], 4, [0, 0]),
+            # budget exhausted within the first round
+            ([0, 0, 0], [12.0, 8.0, 4.0], 4, [3, 1, 0]),
+            ([2, 0, 0], [12.0, 8.0, 4.0], 2, [3, 1, 0]),
+            # further rounds split evenly, the first services get the rest
+            ([1, 0, 0], [12.0, 4.0, 0.0], 6, [4, 3, 0]),
+            ([1, 1, 1], [5.0, 5.0, 5.0], 8, [4, 4, 3]),
+            # ties keep the order they are given in
+            ([0, 0], [5.0, 5.0], 1, [1, 0]),
+            ([0, 0, 0], [7.0, 7.0, 7.0], 5, [2, 2, 1]),
+        ]
+        for deployed_vms, utils, remaining_vms, expected in cases:
+            self.assertEqual(expected, self.assert_matches_loop(deployed_vms, utils, remaining_vms))
+
+    def test_random(self):
+        rand = random.Random(0)
+        for _ in range(2000):
+            n = rand.randint(0, 8)
+            utils = sorted([rand.choice([0.0, rand.random()*30]) for _ in range(n)], reverse=True)
+            deployed_vms = [rand.choice([0, 0, rand.randint(1, 3)]) if u > 0 else 0 for u in utils]
+            self.assert_matches_loop(deployed_vms, utils, rand.randint(0, 30))
+
+
+class TestAllocateVms(unittest.TestCase):
+
+    @staticmethod
+    def allocate(order, utils, num_vms, interval):
+        # VMs of each service when the services are ranked as in order
+        vms = [0]*len(utils)
+        for service, n in zip(order, _allocate_vms([utils[s] for s in order], num_vms, interval)):
+            vms[service] = n
+        return vms
+
+    def assert_truncation_safe(self, utils, num_vms, interval=5.0):
+        # Coordinated.replace_services only ranks the top num_vms services
+        full = sorted(range(len(utils)), key=utils.__getitem__, reverse=True)
+        truncated = heapq.nlargest(num_vms, range(len(utils)), key=utils.__getitem__)
+        self.assertEqual(full[:num_vms], truncated)
+        expected = self.allocate(full, utils, num_vms, interval)
+        self.assertEqual(expected, self.allocate(truncated, utils, num_vms, interval))
+        return expected
+
+    def test_ties_at_cutoff(self):
+        cases = [
+            # (utils, num_vms, expected)
+            # round(util/interval) is 0 for all: the VMs go one per service
+            ([2.0, 2.0, 2.0, 2.0], 3, [1, 1, 1, 0]),
+            ([2.0, 4.0, 2.0, 2.0, 0.0], 3, [1, 2, 0, 0, 0]),
+            # the tie straddles the cutoff after a service takes its VMs
+            ([12.0, 2.0, 2.0, 2.0, 0.0], 3, [3, 0, 0, 0, 0]),
+            ([6.0, 3.0, 3.0, 3.0, 3.0], 4, [1, 1, 1, 1, 0]),
+            ([6.0, 3.0, 3.0, 3.0, 3.0], 6, [2, 1, 1, 1, 1]),
+            # tied services with no utilisation get no VMs
+            ([7.0, 0.0, 0.0, 0.0], 2, [2, 0, 0, 0]),
+            # no VMs
+            ([5.0, 5.0], 0, [0, 0]),
+        ]
+        for utils, num_vms, expected in cases:
+            self.assertEqual(expected, self.assert_truncation_safe(utils, num_vms))
+
+    def test_random_ties(self):
+        rand = random.Random(0)
+        for _ in range(2000):
+            n = rand.randint(0, 10)
+            # Few distinct values, so that ties are common
+            utils = [rand.choice([0.0, 1.0, 2.5, 3.0, 7.5, 12.0]) for _ in range(n)]
+            self.assert_truncation_safe(utils, rand.randint(0, 12))
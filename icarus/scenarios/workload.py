@@ -125,17 +125,16 @@ class StationaryWorkload(object):
             self.first=False
         #aFile = open('workload.txt', 'w')
         #aFile.write("# Time\tNodeID\tserviceID\n")
-        eventObj = self.model.eventQ[0] if len(self.model.eventQ) > 0 else None
-        while req_counter < self.n_warmup + self.n_measured or len(self.model.eventQ) > 0:
+        eventQ = self.model.eventQ
+        while req_counter < self.n_warmup + self.n_measured or len(eventQ) > 0:
             t_event += (random.expovariate(self.rate))
-            eventObj = self.model.eventQ[0] if len(self.model.eventQ) > 0 else None
-            while eventObj is not None and eventObj.time < t_event:
-                heapq.heappop(self.model.eventQ)
+            # eventQ is a heap of (time, seq, event) tuples
+            while len(eventQ) > 0 and eventQ[0][0] < t_event:
+                eventObj = heapq.heappop(eventQ)[2]
                 log = (req_counter >= self.n_warmup)
                 event = {'receiver' : eventObj.receiver, 'content': eventObj.service, 'log' : log, 'node' : eventObj.node, 'flow_id' : eventObj.flow_id, 'deadline' : eventObj.deadline, 'rtt_delay' : eventObj.rtt_delay,'status' : eventObj.status, 'task' : eventObj.task}
 
                 yield (eventObj.time, event)
-                eventObj = self.model.eventQ[0] if len(self.model.eventQ) > 0 else None
 
             if req_counter >= (self.n_warmup + self.n_measured):
                 # skip below if we already sent all the requests